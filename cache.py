@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from time import time
+
+# access times of cache hits are kept in memory until this many keys are waiting, or until the next insert
+ACCESS_FLUSH_SIZE = 100
+
+
+class MetadataCache:
+    # sqlite backed store for decrypted api responses, evicts least recently used entries past max_size bytes
+    def __init__(self, path, max_size, refresh=False):
+        self.max_size = max_size
+        self.refresh = refresh
+        self.lock = threading.Lock()
+
+        import sqlite3
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL
+        )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.db.commit()
+
+        # running total of stored bytes, so inserts don't have to sum the table
+        self.total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        # access times not written yet, keyed by cache key
+        self.accessed = {}
+
+    @staticmethod
+    def make_key(path, params, payload):
+        raw = json.dumps([path, params, payload], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key, ttl):
+        if self.refresh:
+            return None
+
+        now = time()
+        with self.lock:
+            row = self.db.execute('SELECT value, size, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if not row:
+                return None
+            value, size, created = row
+            if now - created > ttl:
+                self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.db.commit()
+                self.total -= size
+                self.accessed.pop(key, None)
+                return None
+            self.accessed[key] = now
+            if len(self.accessed) >= ACCESS_FLUSH_SIZE:
+                self.flush_accessed()
+                self.db.commit()
+
+        return json.loads(value)
+
+    def flush_accessed(self):
+        # has to be called with the lock held, the caller commits
+        if self.accessed:
+            self.db.executemany('UPDATE responses SET accessed = ? WHERE key = ?', [(when, key) for key, when in self.accessed.items()])
+            self.accessed.clear()
+
+    def set(self, key, value):
+        value = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        if len(value) > self.max_size:
+            return
+
+        now = time()
+        with self.lock:
+            # eviction goes by access time, so pending ones have to be written first
+            self.flush_accessed()
+            old = self.db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), now, now)
+            )
+            self.total += len(value) - (old[0] if old else 0)
+            rows = self.db.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall() if self.total > self.max_size else []
+            for old_key, size in rows:
+                if self.total <= self.max_size:
+                    break
+                self.db.execute('DELETE FROM responses WHERE key = ?', (old_key,))
+                self.total -= size
+            self.db.commit()
+
+
+class BoundedDict(OrderedDict):
+    # dict that forgets the least recently used entries once it holds more than max_size
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.max_size:
+                self.popitem(last=False)
+
+
+class MemoCache:
+    # bounded in-process memo, concurrent callers asking for the same key share a single call
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        # has to be called with the lock held
+        if key not in self.entries:
+            return False, None
+        value, expires = self.entries[key]
+        if expires is not None and expires < time():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def peek(self, key):
+        with self.lock:
+            return self.lookup(key)[1]
+
+    def get(self, key, func):
+        while True:
+            with self.lock:
+                found, value = self.lookup(key)
+                if found:
+                    return value
+                event = self.inflight.get(key)
+                if not event:
+                    event = self.inflight[key] = threading.Event()
+                    break
+            # someone else is already fetching this key, if they fail we try again ourselves
+            event.wait()
+
+        try:
+            value = func()
+            with self.lock:
+                # a ttl of None means entries never expire
+                self.entries[key] = (value, time() + self.ttl if self.ttl is not None else None)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            event.set()
+
+        return value
@@ -0,0 +1,96 @@
+import json
+import threading
+from .records import artist_lists
+
+
+class Catalog:
+    # local sqlite index of every song, album and artist seen in api responses
+    def __init__(self, path):
+        import sqlite3
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS items (
+            rowid INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            id TEXT NOT NULL,
+            raw_id TEXT,
+            data TEXT NOT NULL,
+            UNIQUE (type, id)
+        )''')
+        try:
+            self.db.execute('CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(title, artist, album)')
+            self.fts = True
+        except sqlite3.OperationalError:
+            # sqlite built without fts5, fall back to plain LIKE queries
+            self.db.execute('CREATE TABLE IF NOT EXISTS items_fts (rowid INTEGER PRIMARY KEY, title TEXT, artist TEXT, album TEXT)')
+            self.fts = False
+        self.db.commit()
+
+    @staticmethod
+    def extract(resp):
+        # walks a decrypted response and picks out anything that looks like a song, album or artist
+        stack = [resp]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+                continue
+            if not isinstance(item, dict):
+                continue
+            stack.extend(value for value in item.values() if isinstance(value, (dict, list)))
+
+            if 'song_more_url' in item and 'song_name' in item:
+                artists = artist_lists(item.get('artist_role', {}))[0] or [item.get('artist_name', '')]
+                yield 'song', item['song_more_url'], item.get('song_id'), item['song_name'], ' '.join(artists), item.get('album_name', ''), item
+            elif 'album_more_url' in item and 'album_name' in item and 'album_id' in item:
+                yield 'album', item['album_more_url'], item['album_id'], item['album_name'], item.get('artist_name', ''), item['album_name'], item
+            elif 'artist_more_url' in item and 'artist_name' in item and 'album_name' not in item:
+                yield 'artist', item['artist_more_url'], item.get('artist_id'), item['artist_name'], item['artist_name'], '', item
+
+    def index(self, resp):
+        with self.lock:
+            for type, url, raw_id, title, artist, album, item in self.extract(resp):
+                id = url.split('/')[-1]
+                data = json.dumps(item, separators=(',', ':'))
+                raw_id = str(raw_id) if raw_id is not None else None
+
+                row = self.db.execute('SELECT rowid FROM items WHERE type = ? AND id = ?', (type, id)).fetchone()
+                if row:
+                    rowid = row[0]
+                    self.db.execute('UPDATE items SET raw_id = COALESCE(?, raw_id), data = ? WHERE rowid = ?', (raw_id, data, rowid))
+                    self.db.execute('DELETE FROM items_fts WHERE rowid = ?', (rowid,))
+                else:
+                    rowid = self.db.execute('INSERT INTO items (type, id, raw_id, data) VALUES (?, ?, ?, ?)', (type, id, raw_id, data)).lastrowid
+                self.db.execute('INSERT INTO items_fts (rowid, title, artist, album) VALUES (?, ?, ?, ?)', (rowid, title, artist, album))
+            self.db.commit()
+
+    def raw_id(self, type, id):
+        with self.lock:
+            row = self.db.execute('SELECT raw_id FROM items WHERE type = ? AND id = ?', (type, id)).fetchone()
+        return row[0] if row else None
+
+    def search(self, type, query, limit):
+        words = query.split()
+        if not words:
+            return []
+
+        if self.fts:
+            match = ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+            sql = '''SELECT items.data, items_fts.album FROM items_fts JOIN items ON items.rowid = items_fts.rowid
+                WHERE items_fts MATCH ? AND items.type = ? ORDER BY items_fts.rank LIMIT ?'''
+            args = (match, type, limit)
+        else:
+            conditions = ' AND '.join(["(items_fts.title || ' ' || items_fts.artist || ' ' || items_fts.album) LIKE ?"] * len(words))
+            sql = f'''SELECT items.data, items_fts.album FROM items_fts JOIN items ON items.rowid = items_fts.rowid
+                WHERE {conditions} AND items.type = ? LIMIT ?'''
+            args = (*[f'%{word}%' for word in words], type, limit)
+
+        with self.lock:
+            rows = self.db.execute(sql, args).fetchall()
+        results = []
+        for data, album in rows:
+            item = json.loads(data)
+            # songs from album responses don't repeat the album name
+            item.setdefault('album_name', album)
+            results.append(item)
+        return results
@@ -1,21 +1,78 @@
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import NamedTuple
 from urllib.parse import urlparse
 from utils.models import *
 from utils.utils import create_temp_filename
+from .cache import BoundedDict, MemoCache, MetadataCache
+from .catalog import Catalog
 from .kkapi import KkboxAPI
+from .manifest import SyncManifest
+from .records import Song, artist_lists
+from .scheduler import RequestScheduler
+from .workers import ordered_map
 
 
 module_information = ModuleInformation(
     service_name = 'KKBOX',
     module_supported_modes = ModuleModes.download | ModuleModes.lyrics | ModuleModes.covers,
-    global_settings = {'kc1_key': '', 'secret_key': ''},
+    global_settings = {
+        'kc1_key': '',
+        'secret_key': '',
+        'metadata_cache_path': '',
+        'metadata_cache_size': 256,
+        'refresh_metadata_cache': False,
+        'metadata_workers': 8,
+        'connection_pool_size': 16,
+        'connect_timeout': 10,
+        'read_timeout': 60,
+        'api_url': '',
+        'search_cache_ttl': 600,
+        'sync_manifest_path': '',
+        'seed_sync_manifest': False,
+        'catalog_path': '',
+        'requests_per_second': 0,
+        'request_retries': 3,
+        'circuit_breaker_cooldown': 30,
+        'profile_path': '',
+    },
     session_settings = {'email': '', 'password': ''},
-    session_storage_variables = ['kkid'],
+    session_storage_variables = ['kkid', 'sid', 'lic_content_key', 'available_qualities', 'session_expiry'],
     netlocation_constant = 'kkbox',
     url_decoding = ManualEnum.manual,
     test_url = 'https://play.kkbox.com/album/OspOC7CYqcVQY_uLAV'
 )
 
+SEARCH_TYPES = ('song', 'album', 'artist', 'playlist')
+
+
+class Quality(NamedTuple):
+    codec: CodecEnum
+    bitrate: Optional[int]
+    bit_depth: int
+    sample_rate: Optional[float]
+    format: str
+
+QUALITIES = MappingProxyType({
+    '128k': Quality(CodecEnum.MP3, 128, 16, 44.1, 'mp3_128k_chromecast'),
+    '192k': Quality(CodecEnum.MP3, 192, 16, 44.1, 'mp3_192k_kkdrm1'),
+    '320k': Quality(CodecEnum.AAC, 320, 16, 44.1, 'aac_320k_m4a_kkdrm1'),
+    'hifi': Quality(CodecEnum.FLAC, 1411, 16, 44.1, 'flac_16_download_kkdrm'),
+    'hires': Quality(CodecEnum.FLAC, None, 24, None, 'flac_24_download_kkdrm'),
+})
+
+SHORT_URL_HOSTS = {'kkbox.fm', 'www.kkbox.fm'}
+
+_web_path = re.compile(r'^(?:/[a-z]{2}(?:-[a-z]{2})?){0,2}/(song|album|artist|playlist)/([a-zA-Z0-9-_]{18})')
+URL_PATTERNS = {
+    'play.kkbox.com': re.compile(r'^/(track|song|album|artist|playlist)/([a-zA-Z0-9-_]{18})'),
+    'www.kkbox.com': _web_path,
+    'kkbox.com': _web_path,
+}
+
 
 class ModuleInterface:
     def __init__(self, module_controller: ModuleController):
@@ -37,23 +94,94 @@ class ModuleInterface:
         }
 
         self.curr_quality = self.quality_parse[module_controller.orpheus_options.quality_tier]
-
-        kkid = self.tsc.read('kkid')
-        self.session = KkboxAPI(self.exception, settings['kc1_key'], settings['secret_key'], kkid)
-        if kkid:
+        self.metadata_workers = max(1, settings['metadata_workers'])
+        self.pool = ThreadPoolExecutor(self.metadata_workers)
+        # pending lyrics requests for the album being downloaded, keyed by encrypted song id
+        self.lyrics = {}
+        self.lyrics_album = None
+        # 0 turns the search cache off, null keeps results for the whole session
+        self.search_cache = MemoCache(1024, settings['search_cache_ttl']) if settings['search_cache_ttl'] != 0 else None
+        # incremental mode, artists and playlists only return what earlier runs haven't downloaded yet
+        self.manifest = SyncManifest(settings['sync_manifest_path'], settings['seed_sync_manifest']) if settings['sync_manifest_path'] else None
+
+        # song data shared by every lookup in this session, keyed by encrypted song id
+        self.songs = BoundedDict(8192)
+        self.pending_songs = {}
+        # batches being requested right now, keyed by every song id in them
+        self.song_batches = {}
+        self.pending_lock = threading.Lock()
+        # album info and song ids per raw album id, the songs themselves live in self.songs
+        self.albums = MemoCache(256)
+
+        # the api session only gets set up once something actually needs it
+        self.settings = settings
+        self._session = None
+        self.session_lock = threading.Lock()
+        self.credentials = None
+
+        if self.tsc.read('kkid'):
             self.login(settings['email'], settings['password'], new_login=False)
 
+        profile_path = os.environ.get('KKBOX_PROFILE') or settings['profile_path']
+        if profile_path:
+            from .profiler import Profiler
+            Profiler(profile_path, lambda: self._session.metrics if self._session else None).instrument(self)
+
+    @property
+    def session(self):
+        if self._session:
+            return self._session
+
+        with self.session_lock:
+            if not self._session:
+                settings = self.settings
+                cache = None
+                if settings['metadata_cache_path']:
+                    cache = MetadataCache(
+                        settings['metadata_cache_path'],
+                        settings['metadata_cache_size'] * 1024 * 1024,
+                        settings['refresh_metadata_cache']
+                    )
+
+                self._session = KkboxAPI(
+                    self.exception,
+                    settings['kc1_key'],
+                    settings['secret_key'],
+                    self.tsc.read('kkid'),
+                    cache = cache,
+                    pool_size = settings['connection_pool_size'],
+                    timeout = (settings['connect_timeout'], settings['read_timeout']),
+                    api_url = settings['api_url'],
+                    catalog = Catalog(settings['catalog_path']) if settings['catalog_path'] else None,
+                    scheduler = RequestScheduler(
+                        settings['requests_per_second'],
+                        settings['request_retries'],
+                        settings['circuit_breaker_cooldown'],
+                    ),
+                )
+                if self.credentials:
+                    self._session.set_credentials(*self.credentials, self.session_updated)
+
+                # sessions from earlier runs get reused until they're close to expiring
+                sid = self.tsc.read('sid')
+                if sid and self.tsc.read('session_expiry'):
+                    self._session.restore_session(
+                        sid,
+                        self.tsc.read('lic_content_key'),
+                        self.tsc.read('available_qualities'),
+                        self.tsc.read('session_expiry'),
+                    )
+        return self._session
+
     def custom_url_parse(self, link):
-        url = urlparse(link)
+        url = urlparse(link.strip())
 
-        path_match = None
-        if url.hostname == 'play.kkbox.com':
-            path_match = re.match(r'^\/(track|album|artist|playlist)\/([a-zA-Z0-9-_]{18})', url.path)
-        elif url.hostname == 'www.kkbox.com':
-            path_match = re.match(r'^\/[a-z]{2}\/[a-z]{2}\/(song|album|artist|playlist)\/([a-zA-Z0-9-_]{18})', url.path)
-        else:
-            raise self.exception(f'Invalid URL: {link}')
+        if url.hostname in SHORT_URL_HOSTS:
+            # short links only redirect to the regular ones
+            url = urlparse(self.session.resolve_redirect(link.strip()))
 
+        pattern = URL_PATTERNS.get(url.hostname)
+        path_match = pattern.match(url.path) if pattern else None
         if not path_match:
             raise self.exception(f'Invalid URL: {link}')
 
@@ -66,97 +194,152 @@ class ModuleInterface:
             media_id = path_match.group(2)
         )
 
+    def parse_url_file(self, path):
+        # groups every url in a queue file by media type, duplicates and invalid lines get dropped
+        media = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    ident = self.custom_url_parse(line)
+                except self.exception as e:
+                    print(f'KKBOX: skipping {line}: {e}')
+                    continue
+                media.setdefault(ident.media_type, {})[ident.media_id] = None
+        return {type: list(ids) for type, ids in media.items()}
+
     def login(self, email: str, password: str, new_login=True):
-        self.session.login(email, password)
+        # the actual login happens on the first request that needs a session
+        self.credentials = (email, password)
+        if self._session:
+            self._session.set_credentials(email, password, self.session_updated)
         if new_login:
+            self.session.reset_session()
             self.tsc.set('kkid', self.session.kkid)
-        if self.check_sub and self.curr_quality not in self.session.available_qualities:
+
+    def session_updated(self, renewal=False):
+        self.tsc.set('sid', self.session.sid)
+        self.tsc.set('lic_content_key', self.session.lic_content_key.decode('ascii'))
+        self.tsc.set('available_qualities', self.session.available_qualities)
+        self.tsc.set('session_expiry', self.session.session_expiry)
+
+        # renewals keep the subscription of the login they came from, no need to warn again
+        if not renewal and self.check_sub and self.curr_quality not in self.session.available_qualities:
             print('KKBOX: quality set in the settings is not accessible by the current subscription')
 
+    def queue_songs(self, ids):
+        with self.pending_lock:
+            for id in ids:
+                if id not in self.songs:
+                    self.pending_songs[id] = None
+
+    def get_song(self, track_id):
+        while True:
+            song = self.songs.get(track_id)
+            if song:
+                return song
+
+            with self.pending_lock:
+                batch = self.song_batches.get(track_id)
+                if not batch:
+                    # resolve everything queued so far along with this track in as few calls as possible
+                    self.pending_songs[track_id] = None
+                    ids = [id for id in self.pending_songs if id not in self.song_batches]
+                    batch = {'event': threading.Event(), 'songs': None}
+                    for id in ids:
+                        self.song_batches[id] = batch
+                    break
+
+            # someone else is already fetching this track, if they fail we try again ourselves
+            batch['event'].wait()
+            if batch['songs'] is not None:
+                return self.found_song(track_id, batch['songs'])
+
+        try:
+            songs = {}
+            for raw in self.session.get_songs_batched(ids):
+                song = Song(raw)
+                songs[song.id] = song
+                self.songs[song.id] = song
+            batch['songs'] = songs
+            # queued ids are only dropped once they were actually resolved
+            with self.pending_lock:
+                for id in ids:
+                    self.pending_songs.pop(id, None)
+        finally:
+            with self.pending_lock:
+                for id in ids:
+                    del self.song_batches[id]
+            batch['event'].set()
+
+        return self.found_song(track_id, songs)
+
+    def found_song(self, track_id, songs):
+        if track_id not in songs:
+            raise self.exception('Track not found')
+        return songs[track_id]
+
     def get_track_info(self, track_id: str, quality_tier: QualityEnum, codec_options: CodecOptions, data={}, alb_info={}, artist_dl=False) -> TrackInfo:
         quality = self.quality_parse[quality_tier]
-        data = data.get(track_id)
-        if not data:
-            data = self.session.get_songs([track_id])[0]
+        song = data.get(track_id) or self.get_song(track_id)
 
+        # album info only gets passed in when the whole album is being downloaded
+        album_dl = bool(alb_info)
         if not alb_info:
-            album_id = data.get('raw_album_id') or int(data['album_id'])
-            alb_data = self.session.get_album_more(album_id)
-            alb_info = alb_data['info']
-            alb_info['num_tracks'] = len(alb_data['song_list']['song'])
+            alb_info = self.get_album_data(song.album_id)[0]
 
         tags = Tags(
             album_artist = alb_info['artist_name'],
-            track_number = int(data['song_idx']),
+            track_number = song.track_number,
             total_tracks = alb_info['num_tracks'],
-            genres = [data['genre_name']],
+            genres = [song.genre],
             release_date = alb_info['album_date'],
         )
 
-        if 'mainartist_list' in data['artist_role']:
-            data['artist_role']['mainartists'] = data['artist_role']['mainartist_list']['mainartist']
-        if 'featuredartist_list' in data['artist_role']:
-            data['artist_role']['featuredartists'] = data['artist_role']['featuredartist_list']['featuredartist']
-
         # sometimes the artist name in the mainartists list is different from the actual one
         # if an entire artist is being downloaded, the actual artist name gets used instead
         # to make sure that orpheusdl doesn't skip tracks
         # example: https://play.kkbox.com/artist/GtjT_E-Fw6HSCE7jgQ
-        artists = data['artist_role']['mainartists'] if not artist_dl else [alb_info['artist_name']]
-        if 'featuredartists' in data['artist_role']:
-            artists.extend(data['artist_role']['featuredartists'])
+        artists = list(song.main_artists) if not artist_dl else [alb_info['artist_name']]
+        artists.extend(song.featured_artists)
 
-        if quality not in data['audio_quality']:
-            quality = data['audio_quality'][-1]
+        if quality not in song.audio_quality:
+            quality = song.audio_quality[-1]
 
         error = None
+        self.session.ensure_session()
         if quality not in self.session.available_qualities:
             error = 'Quality not available by your subscription'
+            # orpheusdl skips tracks with errors, so they'd otherwise hold up their album forever
+            if self.manifest:
+                self.manifest.track_done(song.id)
 
-        codec = {
-            '128k': CodecEnum.MP3,
-            '192k': CodecEnum.MP3,
-            '320k': CodecEnum.AAC,
-            'hifi': CodecEnum.FLAC,
-            'hires': CodecEnum.FLAC,
-        }[quality]
-
-        bitrate = {
-            '128k': 128,
-            '192k': 192,
-            '320k': 320,
-            'hifi': 1411,
-            'hires': None,
-        }[quality]
+        descriptor = QUALITIES[quality]
 
         return TrackInfo(
-            name = data.get('song_name') or data['text'],
-            album_id = alb_info['album_more_url'].split('/')[-1],
+            name = song.name,
+            album_id = alb_info['encrypted_album_id'],
             album = alb_info['album_name'],
             artists = artists,
             tags = tags,
-            codec = codec,
-            cover_url = self.get_img_url(data['album_photo_info']['url_template'], self.default_cover.resolution, self.default_cover.file_type),
-            release_year = int(alb_info['album_date'].split('-')[0]),
-            explicit = bool(data['song_is_explicit']),
-            artist_id = alb_info['artist_more_url'].split('/')[-1],
-            bit_depth = 16 if quality != 'hires' else 24,
-            sample_rate = 44.1 if quality != 'hires' else None,
-            bitrate = bitrate,
-            download_extra_kwargs = {'id': data['song_more_url'].split('/')[-1], 'quality': quality},
-            cover_extra_kwargs = {'data': data},
-            lyrics_extra_kwargs = {'data': data},
+            codec = descriptor.codec,
+            cover_url = self.get_img_url(song.url_template, self.default_cover.resolution, self.default_cover.file_type),
+            release_year = alb_info['release_year'],
+            explicit = song.explicit,
+            artist_id = alb_info['encrypted_artist_id'],
+            bit_depth = descriptor.bit_depth,
+            sample_rate = descriptor.sample_rate,
+            bitrate = descriptor.bitrate,
+            download_extra_kwargs = {'id': song.id, 'quality': quality},
+            cover_extra_kwargs = {'data': song},
+            lyrics_extra_kwargs = {'data': song, 'album_dl': album_dl},
             error = error
         )
 
     def get_track_download(self, id, quality):
-        format = {
-            '128k': 'mp3_128k_chromecast',
-            '192k': 'mp3_192k_kkdrm1',
-            '320k': 'aac_320k_m4a_kkdrm1',
-            'hifi': 'flac_16_download_kkdrm',
-            'hires': 'flac_24_download_kkdrm',
-        }[quality]
+        format = QUALITIES[quality].format
 
         # used for getting DRM-free mp3 128k urls
         play_mode = None
@@ -167,47 +350,72 @@ class ModuleInterface:
         urls = self.session.get_ticket(id, play_mode)
         for fmt in urls:
             if fmt['name'] == format:
-                if format == 'mp3_128k_chromecast':
-                    return TrackDownloadInfo(
-                        download_type = DownloadEnum.URL,
-                        file_url = fmt['url'],
-                    )
                 url = fmt['url']
                 break
 
-        temp_path = create_temp_filename()
-        self.session.kkdrm_dl(url, temp_path)
+        if format == 'mp3_128k_chromecast':
+            download = TrackDownloadInfo(
+                download_type = DownloadEnum.URL,
+                file_url = url,
+            )
+        else:
+            temp_path = create_temp_filename()
+            self.session.kkdrm_dl(url, temp_path)
 
-        return TrackDownloadInfo(
-            download_type = DownloadEnum.TEMP_FILE_PATH,
-            temp_file_path = temp_path
-        )
+            download = TrackDownloadInfo(
+                download_type = DownloadEnum.TEMP_FILE_PATH,
+                temp_file_path = temp_path
+            )
+
+        # this is as close to a finished download as the module gets to see
+        if self.manifest:
+            self.manifest.track_done(id)
+        return download
+
+    def prepare_album_info(self, data):
+        # fields every track of an album needs, worked out once per album
+        info = data['info']
+        return {
+            **info,
+            'num_tracks': len(data['song_list']['song']),
+            'encrypted_album_id': info['album_more_url'].split('/')[-1],
+            'encrypted_artist_id': info['artist_more_url'].split('/')[-1],
+            'release_year': int(info['album_date'].split('-')[0]),
+        }
+
+    def get_album_data(self, raw_id):
+        return self.albums.get(str(raw_id), lambda: self.load_album(raw_id))
+
+    def load_album(self, raw_id):
+        data = self.session.get_album_more(raw_id)
+        songs = [Song(raw) for raw in data['song_list']['song']]
+        self.songs.update((song.id, song) for song in songs)
+        return self.prepare_album_info(data), tuple(song.id for song in songs)
 
     def get_album_info(self, album_id: str, raw_ids={}, artist_dl=False) -> Optional[AlbumInfo]:
         raw_id = raw_ids.get(album_id)
+        if not raw_id and self.session.catalog:
+            raw_id = self.session.catalog.raw_id('album', album_id)
         if not raw_id:
             raw_id = self.session.get_album(album_id)['album']['album_id']
 
-        data = self.session.get_album_more(raw_id)
+        info, song_ids = self.get_album_data(raw_id)
 
-        info = data['info']
+        # songs pushed out of self.songs since the album was loaded get looked up again in one go
+        self.queue_songs(song_ids)
+        song_id_list = list(song_ids)
+        data_kwargs = {id: self.get_song(id) for id in song_id_list}
 
-        data_kwargs = {}
-        song_id_list = []
-        for song in data['song_list']['song']:
-            id = song['song_more_url'].split('/')[-1]
-            song_id_list.append(id)
-            data_kwargs[id] = song
-        
-        info['num_tracks'] = len(song_id_list)
+        if self.manifest:
+            self.manifest.album_tracks(album_id, song_id_list)
 
         return AlbumInfo(
             name = info['album_name'],
             artist = info['artist_name'],
             tracks = song_id_list,
-            release_year = int(info['album_date'].split('-')[0]),
+            release_year = info['release_year'],
             explicit = bool(info['album_is_explicit']),
-            artist_id = info['artist_more_url'].split('/')[-1],
+            artist_id = info['encrypted_artist_id'],
             cover_url = self.get_img_url(info['album_photo_info']['url_template'], self.default_cover.resolution, self.default_cover.file_type),
             cover_type = self.default_cover.file_type,
             all_track_cover_jpg_url = self.get_img_url(info['album_photo_info']['url_template'], self.default_cover.resolution, ImageFileTypeEnum.jpg),
@@ -220,10 +428,14 @@ class ModuleInterface:
 
         data_kwargs = {}
         song_id_list = []
-        for song in data['songs']:
-            id = song['song_more_url'].split('/')[-1]
-            song_id_list.append(id)
-            data_kwargs[id] = song
+        for raw in data['songs']:
+            song = Song(raw)
+            song_id_list.append(song.id)
+            data_kwargs[song.id] = song
+        self.songs.update(data_kwargs)
+
+        if self.manifest:
+            song_id_list = self.manifest.new_playlist_tracks(playlist_id, data.get('updated_at'), song_id_list)
 
         return PlaylistInfo(
             name = data['title'],
@@ -237,6 +449,18 @@ class ModuleInterface:
             track_extra_kwargs = {'data': data_kwargs}
         )
 
+    def iter_playlist_tracks(self, playlist_ids):
+        # yields (playlist id, track id) pairs, tracks shared between playlists only come up once
+        seen = set()
+        for playlist in self.session.iter_playlists(list(playlist_ids)):
+            for raw in playlist['songs']:
+                id = raw['song_more_url'].split('/')[-1]
+                if id in seen:
+                    continue
+                seen.add(id)
+                self.songs[id] = Song(raw)
+                yield playlist['id'], id
+
     def get_artist_info(self, artist_id: str, get_credited_albums: bool, data=None) -> ArtistInfo:
         profile = data
         albums = []
@@ -257,43 +481,87 @@ class ModuleInterface:
             album_id_list.append(id)
             raw_ids[id] = album['album_id']
 
+        if self.manifest:
+            album_id_list = self.manifest.new_albums(artist_id, [(album['encrypted_album_id'], album.get('album_date')) for album in albums])
+
         return ArtistInfo(
             name = profile['artist_name'],
             albums = album_id_list,
             album_extra_kwargs = {'raw_ids': raw_ids, 'artist_dl': True},
         )
 
+    def iter_artist_albums(self, artist_id: str, get_credited_albums: bool, data=None):
+        artist_info = self.get_artist_info(artist_id, get_credited_albums, data)
+        kwargs = artist_info.album_extra_kwargs
+        yield from ordered_map(lambda id: self.get_album_info(id, **kwargs), artist_info.albums, self.metadata_workers)
+
     def get_track_cover(self, track_id: str, cover_options: CoverOptions, data=None) -> CoverInfo:
-        data = data or self.session.get_songs([track_id])[0]
-        url_template = data['album_photo_info']['url_template']
-        url = self.get_img_url(url_template, cover_options.resolution, cover_options.file_type)
+        song = data or self.get_song(track_id)
+        url = self.get_img_url(song.url_template, cover_options.resolution, cover_options.file_type)
         return CoverInfo(url=url, file_type=cover_options.file_type)
 
-    def get_track_lyrics(self, track_id: str, data={}) -> LyricsInfo:
-        if data.get('is_lyrics') == False or data.get('song_lyrics_valid') == 0:
+    def prefetch_album_lyrics(self, song):
+        # lyrics for the rest of the album are fetched concurrently once the first track asks for them
+        # whatever is left over from the previous album won't be asked for anymore
+        if song.album_id != self.lyrics_album:
+            for future in self.lyrics.values():
+                future.cancel()
+            self.lyrics.clear()
+            self.lyrics_album = song.album_id
+
+        album = self.albums.peek(str(song.album_id)) if song.album_id else None
+        songs = [self.songs.get(id) for id in album[1]] if album else [song]
+
+        for song in songs:
+            if not song or song.id in self.lyrics or not song.has_lyrics:
+                continue
+            self.lyrics[song.id] = self.pool.submit(self.session.get_song_lyrics, song.id)
+
+    def get_track_lyrics(self, track_id: str, data=None, album_dl=False) -> LyricsInfo:
+        song = data or self.songs.get(track_id)
+        if song and not song.has_lyrics:
             return LyricsInfo()
-        resp = self.session.get_song_lyrics(track_id)
+
+        if album_dl and song and track_id not in self.lyrics:
+            self.prefetch_album_lyrics(song)
+        future = self.lyrics.pop(track_id, None)
+        resp = future.result() if future else self.session.get_song_lyrics(track_id)
         if resp['status']['type'] != 'OK':
             return LyricsInfo()
 
-        embedded = ''
-        synced = ''
+        embedded = []
+        synced = []
         for lyr in resp['data']['lyrics']:
-            if not lyr['content']:
-                embedded += '\n'
-                synced += '\n'
+            content = lyr['content']
+            if not content:
+                embedded.append('\n')
+                synced.append('\n')
                 continue
 
-            time = lyr['start_time']
-            min = int(time / (1000 * 60))
-            sec = int(time / 1000) % 60
-            ms = int(time % 100)
-            time_tag = f'[{min:02d}:{sec:02d}.{ms:02d}]'
-
-            embedded += lyr['content'] + '\n'
-            synced += time_tag + lyr['content'] + '\n'
-
-        return LyricsInfo(embedded, synced)
+            time = int(lyr['start_time'])
+            min = time // (1000 * 60)
+            sec = time // 1000 % 60
+            cs = time % 1000 // 10
+            embedded.append(f'{content}\n')
+            synced.append(f'[{min:02d}:{sec:02d}.{cs:02d}]{content}\n')
+
+        return LyricsInfo(''.join(embedded), ''.join(synced))
+
+    def search_all(self, query: str, limit: int = 10):
+        # every result type comes back from a single request, so searching the same query for another type is free
+        if not self.search_cache:
+            return self.session.search(query, SEARCH_TYPES, limit)
+        key = (' '.join(query.casefold().split()), limit)
+        return self.search_cache.get(key, lambda: self.session.search(query, SEARCH_TYPES, limit))
+
+    def match_tracks(self, path: str):
+        # yields the input tracks from a csv or jsonl file in order, with the best matching song id and a 0-1 confidence
+        from .matcher import TrackMatcher, load_tracks
+        matcher = TrackMatcher(self.search_all, self.metadata_workers)
+        for match in matcher.match_all(load_tracks(path)):
+            if match['id']:
+                self.queue_songs([match['id']])
+            yield match
 
     def search(self, query_type: DownloadTypeEnum, query: str, track_info: TrackInfo = None, limit: int = 10):
         query_type = query_type.name
@@ -302,22 +570,28 @@ class ModuleInterface:
 
         # tfw this shitty streaming service has no way to search for ISRCs
 
-        results = self.session.search(query, [query_type], limit)[f'{query_type}_list'][query_type]
+        results = []
+        if self.session.catalog and query_type != 'playlist':
+            # only trust the local index when it can fill the whole page
+            results = self.session.catalog.search(query_type, query, limit)
+        if len(results) < limit:
+            results = self.search_all(query, limit).get(f'{query_type}_list', {}).get(query_type, [])
 
         if query_type == 'song':
+            # whichever hits get picked are then looked up together in one v2/song request
+            self.queue_songs(i['song_more_url'].split('/')[-1] for i in results)
             search_results = []
             for i in results:
-                artists = i['artist_role']['mainartist_list']['mainartist']
-                if 'featuredartist_list' in i['artist_role']:
-                    artists.extend(i['artist_role']['featuredartist_list']['featuredartist'])
-            
+                # catalog hits can come from album or playlist responses, which use a different artist shape
+                main_artists, featured_artists = artist_lists(i['artist_role'])
+                artists = [*main_artists, *featured_artists]
+
                 search_results.append(SearchResult(
                     result_id = i['song_more_url'].split('/')[-1],
                     name = i['song_name'],
                     artists = artists,
                     explicit = i['song_is_explicit'],
-                    additional = [i['album_name']],
-                    extra_kwargs = {'data': i}
+                    additional = [i['album_name']]
                 ))
             return search_results
         elif query_type == 'album':
@@ -1,15 +1,58 @@
+import hashlib
 import json
 import re
-from time import time, sleep
+import threading
+from collections import ChainMap
+from types import MappingProxyType
+from time import time, time_ns, perf_counter, sleep
 from random import randrange
-from Cryptodome.Cipher import ARC4
-from Cryptodome.Hash import MD5
-from tqdm import tqdm
-from utils.utils import create_requests_session
+from .metrics import Metrics, endpoint_name
+from .scheduler import RequestScheduler, TransientError
+
+# how long cached responses from the ds host stay valid in seconds, only successful responses get cached
+# songs without lyrics are already known from is_lyrics in their metadata, so their lyrics never get requested
+CACHE_TTLS = (
+    (re.compile(r'^album_more\.php$'), 7 * 24 * 3600),
+    (re.compile(r'^v1/album/'), 30 * 24 * 3600),
+    (re.compile(r'^v3/artist/'), 24 * 3600),
+    (re.compile(r'^v2/artist/[^/]+/album$'), 24 * 3600),
+    (re.compile(r'^v1/playlists$'), 3600),
+    (re.compile(r'^v1/song/[^/]+/lyrics$'), 30 * 24 * 3600),
+)
+
+API_HOSTS = ('ds', 'login', 'ticket')
+API_URL = 'https://api-{host}.kkbox.com.tw'
+
+# rough estimate of how long a sid stays valid, sessions get renewed through check.php a bit before that
+SESSION_LIFETIME = 12 * 3600
+SESSION_RENEW_MARGIN = 1800
+
+class RequestSigner:
+    # the secret only changes once per second, so it gets computed once per timestamp
+    def __init__(self, ver, secret_key):
+        self.ver = ver.encode('ascii')
+        self.secret_key = secret_key
+        self.last = (None, None)
+
+    def sign(self, timestamp):
+        last_timestamp, secret = self.last
+        if timestamp != last_timestamp:
+            md5 = hashlib.md5()
+            md5.update(self.ver)
+            md5.update(str(timestamp).encode('ascii'))
+            md5.update(self.secret_key)
+            secret = md5.hexdigest()
+            self.last = (timestamp, secret)
+        return secret
 
 class KkboxAPI:
-    def __init__(self, exception, kc1_key, secret_key, kkid = None):
+    def __init__(self, exception, kc1_key, secret_key, kkid = None, cache = None, pool_size = None, timeout = None, session = None, api_url = None, catalog = None, scheduler = None):
         self.exception = exception
+        # every ds request goes through the scheduler, login and ticket calls are left alone
+        self.scheduler = scheduler or RequestScheduler()
+        self.cache = cache
+        self.catalog = catalog
+        self.metrics = Metrics()
 
         key_pattern = re.compile("[0-9a-f]{32}")
         if not key_pattern.fullmatch(kc1_key):
@@ -20,12 +63,33 @@ class KkboxAPI:
         self.kc1_key = kc1_key.encode('ascii')
         self.secret_key = secret_key.encode('ascii')
 
-        self.s = create_requests_session()
+        self.api_url = api_url or API_URL
+
+        # any requests-compatible session can be passed in as the transport
+        self.s = session
+        if not self.s:
+            from requests.adapters import HTTPAdapter
+            from utils.utils import create_requests_session
+            self.s = create_requests_session()
+            retries = self.s.get_adapter('https://').max_retries
+            pool_size = pool_size or 10
+            for host in API_HOSTS:
+                # ds requests are retried by the scheduler, which has to see 429 and 5xx responses itself
+                self.s.mount(self.host_url(host) + '/', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0 if host == 'ds' else retries))
+            self.s.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries))
+        self.timeout = timeout
+
         self.s.headers.update({
             'user-agent': 'okhttp/3.14.9'
         })
 
         self.kkid = kkid or '%032X' % randrange(16**32)
+        self.sid = None
+        self.available_qualities = []
+        self.session_expiry = 0
+        self.credentials = None
+        self.on_session = None
+        self.login_lock = threading.Lock()
 
         self.params = {
             'enc': 'u',
@@ -40,37 +104,142 @@ class KkboxAPI:
             'of': 'j',
             'oenc': 'kc1',
         }
+        self.base_params = MappingProxyType(dict(self.params))
+        self.signer = RequestSigner(self.params['ver'], self.secret_key)
+
+    def host_url(self, host):
+        return self.api_url.replace('{host}', host)
 
-    def kc1_decrypt(self, data):
+    def kc1_decrypt_stream(self, chunks):
+        # rc4 is a stream cipher, so chunks can be decrypted as they arrive without keeping the ciphertext around
+        from Cryptodome.Cipher import ARC4
         cipher = ARC4.new(self.kc1_key)
-        return cipher.decrypt(data).decode('utf-8')
+        data = bytearray()
+        decrypt_time = 0.0
+        for chunk in chunks:
+            start = perf_counter()
+            data += cipher.decrypt(chunk)
+            decrypt_time += perf_counter() - start
+        return data, decrypt_time
+
+    def cache_ttl(self, host, path):
+        if not self.cache or host != 'ds':
+            return None
+        for pattern, ttl in CACHE_TTLS:
+            if pattern.match(path):
+                return ttl
+        return None
+
+    def api_call(self, host, path, params=None, payload=None):
+        params = params or {}
+        event = {
+            'host': host,
+            'path': path,
+            'endpoint': endpoint_name(path),
+            'start_ns': time_ns(),
+            'cached': None,
+            'status': None,
+            'bytes': 0,
+            'decrypt_time': 0.0,
+            'parse_time': 0.0,
+            'error': None,
+        }
+        start = perf_counter()
+        # failed calls get recorded too, with the type of the underlying exception in the error field
+        try:
+            return self.request(host, path, params, payload, event)
+        except Exception as e:
+            event['error'] = type(e.__cause__ or e).__name__
+            raise
+        finally:
+            event['total_time'] = perf_counter() - start
+            self.metrics.record(event)
+
+    def request(self, host, path, params, payload, event):
+        ttl = self.cache_ttl(host, path)
+        if ttl:
+            cache_key = self.cache.make_key(path, params, payload)
+            resp = self.cache.get(cache_key, ttl)
+            event['cached'] = resp is not None
+            if resp is not None:
+                return resp
+
+        if host != 'login':
+            self.ensure_session()
 
-    def api_call(self, host, path, params={}, payload=None):
         if host == 'ticket':
             payload = json.dumps(payload)
 
-        timestamp = int(time())
+        send = lambda: self.send(host, path, params, payload, event)
+        try:
+            resp = self.scheduler.run(send) if host == 'ds' else send()
+        except self.scheduler.transient as e:
+            raise self.exception(str(e) or type(e).__name__) from e
+
+        if self.catalog and host == 'ds' and resp:
+            self.catalog.index(resp)
 
-        md5 = MD5.new()
-        md5.update(self.params['ver'].encode('ascii'))
-        md5.update(str(timestamp).encode('ascii'))
-        md5.update(self.secret_key)
+        if ttl and isinstance(resp, dict):
+            status = resp.get('status')
+            if not isinstance(status, dict) or status.get('type') == 'OK':
+                self.cache.set(cache_key, resp)
 
-        params.update(self.params)
-        params.update({'secret': md5.hexdigest()})
-        params.update({'timestamp': timestamp})
+        return resp
+
+    def send(self, host, path, params, payload, event):
+        timestamp = int(time())
+        # layered view over the shared base params, the caller's dict is left untouched
+        query = ChainMap({'secret': self.signer.sign(timestamp), 'timestamp': timestamp}, self.base_params, params)
 
-        url = f'https://api-{host}.kkbox.com.tw/{path}'
+        url = f'{self.host_url(host)}/{path}'
         if not payload:
-            r = self.s.get(url, params=params)
+            r = self.s.get(url, params=query, timeout=self.timeout, stream=True)
         else:
-            r = self.s.post(url, params=params, data=payload)
+            r = self.s.post(url, params=query, data=payload, timeout=self.timeout, stream=True)
+
+        event['status'] = r.status_code
+        if r.status_code == 429 or r.status_code >= 500:
+            r.close()
+            raise TransientError(f'HTTP {r.status_code} from {host}/{path}')
+
+        # only the plaintext gets buffered, json.loads still decodes it to a str internally
+        data, event['decrypt_time'] = self.kc1_decrypt_stream(r.iter_content(chunk_size=65536))
+        event['bytes'] = len(data)
 
-        resp = json.loads(self.kc1_decrypt(r.content)) if r.content else None
+        parse_start = perf_counter()
+        resp = json.loads(data) if data else None
+        event['parse_time'] = perf_counter() - parse_start
         return resp
 
+    def set_credentials(self, email, password, on_session=None):
+        # logging in is put off until a request actually needs a session
+        # on_session gets called whenever a new session is applied, so it can be stored
+        # it's passed whether the session came from a renewal rather than a full login
+        self.credentials = (email, password)
+        self.on_session = on_session
+
+    def session_valid(self):
+        return self.sid and time() < self.session_expiry - SESSION_RENEW_MARGIN
+
+    def ensure_session(self):
+        if self.session_valid() or not (self.sid or self.credentials):
+            return
+        with self.login_lock:
+            if not self.sid:
+                self.login(*self.credentials)
+            elif not self.session_valid():
+                self.refresh_session()
+
+    def refresh_session(self):
+        try:
+            self.renew_session()
+        except self.exception:
+            if not self.credentials:
+                raise
+            self.login(*self.credentials)
+
     def login(self, email, password):
-        md5 = MD5.new()
+        md5 = hashlib.md5()
         md5.update(password.encode('utf-8'))
         pswd = md5.hexdigest()
 
@@ -98,11 +267,12 @@ class KkboxAPI:
         resp = self.api_call('login', 'check.php')
         if resp['status'] not in (2, 3):
             raise self.exception('Session renewal failed')
-        self.apply_session(resp)
+        self.apply_session(resp, renewal=True)
 
-    def apply_session(self, resp):
+    def apply_session(self, resp, renewal=False):
         self.sid = resp['sid']
         self.params['sid'] = self.sid
+        self.base_params = MappingProxyType(dict(self.params))
 
         self.lic_content_key = resp['lic_content_key'].encode('ascii')
 
@@ -111,6 +281,24 @@ class KkboxAPI:
             self.available_qualities.append('hifi')
             self.available_qualities.append('hires')
 
+        self.session_expiry = int(time()) + SESSION_LIFETIME
+        if self.on_session:
+            self.on_session(renewal)
+
+    def restore_session(self, sid, lic_content_key, available_qualities, expiry):
+        self.sid = sid
+        self.params['sid'] = self.sid
+        self.base_params = MappingProxyType(dict(self.params))
+        self.lic_content_key = lic_content_key.encode('ascii')
+        self.available_qualities = list(available_qualities)
+        self.session_expiry = expiry
+
+    def reset_session(self):
+        self.sid = None
+        self.params.pop('sid', None)
+        self.base_params = MappingProxyType(dict(self.params))
+        self.session_expiry = 0
+
     def get_songs(self, ids):
         resp = self.api_call('ds', 'v2/song', payload={
             'ids': ','.join(ids),
@@ -120,6 +308,12 @@ class KkboxAPI:
             raise self.exception('Track not found')
         return resp['data']['songs']
 
+    def get_songs_batched(self, ids, batch_size=100):
+        songs = []
+        for i in range(0, len(ids), batch_size):
+            songs.extend(self.get_songs(ids[i:i + batch_size]))
+        return songs
+
     def get_song_lyrics(self, id):
         return self.api_call('ds', f'v1/song/{id}/lyrics')
 
@@ -157,6 +351,10 @@ class KkboxAPI:
             raise self.exception('Playlist not found')
         return resp['data']['playlists']
 
+    def iter_playlists(self, ids, batch_size=20):
+        for i in range(0, len(ids), batch_size):
+            yield from self.get_playlists(ids[i:i + batch_size])
+
     def search(self, query, types, limit):
         return self.api_call('ds', 'search_music.php', params={
             'sf': ','.join(types),
@@ -166,6 +364,7 @@ class KkboxAPI:
         })
 
     def get_ticket(self, song_id, play_mode = None):
+        self.ensure_session()
         resp = self.api_call('ticket', 'v1/ticket', payload={
             'sid': self.sid,
             'song_id': song_id,
@@ -181,7 +380,7 @@ class KkboxAPI:
 
         if resp['status'] != 1:
             if resp['status'] == -1:
-                self.renew_session()
+                self.refresh_session()
                 return self.get_ticket(song_id, play_mode)
             elif resp['status'] == -4:
                 self.auth_device()
@@ -196,6 +395,7 @@ class KkboxAPI:
         return resp['uris']
 
     def auth_device(self):
+        self.ensure_session()
         resp = self.api_call('ds', 'active_sid.php', payload={
             'ui_lang': 'en',
             'of': 'j',
@@ -211,12 +411,22 @@ class KkboxAPI:
         if resp['status'] != 1:
             raise self.exception("Couldn't auth device")
 
+    def resolve_redirect(self, url):
+        from requests import RequestException
+        try:
+            r = self.s.head(url, allow_redirects=True, timeout=self.timeout)
+        except RequestException as e:
+            raise self.exception(f"Couldn't resolve {url}: {type(e).__name__}") from e
+        return r.url
+
     def kkdrm_dl(self, url, path):
         # skip first 1024 bytes of track file
-        resp = self.s.get(url, stream=True, headers={'range': 'bytes=1024-'})
+        resp = self.s.get(url, stream=True, headers={'range': 'bytes=1024-'}, timeout=self.timeout)
         resp.raise_for_status()
 
         size = int(resp.headers['content-length'])
+        from Cryptodome.Cipher import ARC4
+        from tqdm import tqdm
         bar = tqdm(total=size, unit='B', unit_scale=True)
 
         # drop 512 bytes of keystream
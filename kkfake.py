@@ -0,0 +1,210 @@
+# local stand-in for the KKBOX API, serves a synthetic catalog encrypted the same way as the real thing
+# usage: python kkfake.py --port 8000 --latency 0.05
+# then set api_url to http://127.0.0.1:8000/{host} and kc1_key to the key passed here
+import argparse
+import json
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import urlparse, parse_qs
+from Cryptodome.Cipher import ARC4
+
+DEFAULT_KEY = '0' * 32
+ID_PATTERN = re.compile(r'/(?:\d+|[a-zA-Z0-9-_]{18})(?=/|$)')
+
+
+def enc_id(prefix, raw_id):
+    # fake encrypted ids keep the 18 character shape and can be turned back into raw ids
+    return f'{prefix}{raw_id:017d}'
+
+
+def raw_id(id):
+    return int(id[1:])
+
+
+class FakeCatalog:
+    # artist n owns albums n * 1000 + i, album m owns songs m * 100 + j
+    def __init__(self, albums_per_artist=20, tracks_per_album=12):
+        self.albums_per_artist = albums_per_artist
+        self.tracks_per_album = tracks_per_album
+        # requests served so far, with ids in paths collapsed so e.g. every v1/album/{id} call is counted together
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        # makes check.php turn down every session, for testing the fallback to a new login
+        self.reject_renewals = False
+
+    def artist_ref(self, artist):
+        return {
+            'artist_name': f'Artist {artist}',
+            'artist_more_url': f'https://play.kkbox.com/artist/{enc_id("R", artist)}',
+        }
+
+    def album(self, album):
+        artist = album // 1000
+        return {
+            'album_id': album,
+            'encrypted_album_id': enc_id('A', album),
+            'album_name': f'Album {album}',
+            'album_date': f'{2000 + album % 20}-01-01',
+            'album_more_url': f'https://play.kkbox.com/album/{enc_id("A", album)}',
+            'album_is_explicit': 0,
+            'album_descr': '',
+            'album_photo_info': {'url_template': f'https://i.kfs.io/album/{album}/fit/{{width}}x{{height}}.{{format}}'},
+            **self.artist_ref(artist),
+        }
+
+    def song(self, song, flat_artists=False):
+        # v1/playlists lists artists as mainartists, everything else uses mainartist_list
+        album = song // 100
+        artist = album // 1000
+        return {
+            'song_id': song,
+            'song_name': f'Song {song}',
+            'song_idx': song % 100,
+            'song_more_url': f'https://play.kkbox.com/song/{enc_id("S", song)}',
+            'song_is_explicit': 0,
+            'genre_name': 'Pop',
+            'is_lyrics': True,
+            'audio_quality': ['128k', '192k', '320k', 'hifi'],
+            'album_id': str(album),
+            'album_name': f'Album {album}',
+            'album_photo_info': {'url_template': f'https://i.kfs.io/album/{album}/fit/{{width}}x{{height}}.{{format}}'},
+            'artist_role': {'mainartists': [f'Artist {artist}']} if flat_artists else {'mainartist_list': {'mainartist': [f'Artist {artist}']}},
+            **self.artist_ref(artist),
+        }
+
+    def album_songs(self, album):
+        return [self.song(album * 100 + j) for j in range(1, self.tracks_per_album + 1)]
+
+    def artist_albums(self, artist):
+        return [self.album(artist * 1000 + i) for i in range(1, self.albums_per_artist + 1)]
+
+    def playlist(self, playlist):
+        # 100 songs each, playlist n shares its last 50 with the first 50 of playlist n + 1
+        tracks = range(playlist * 50, playlist * 50 + 100)
+        songs = [self.song((1001 + n // self.tracks_per_album) * 100 + n % self.tracks_per_album + 1, True) for n in tracks]
+        return {
+            'id': enc_id('P', playlist),
+            'title': f'Playlist {playlist}',
+            'user': {'name': 'Fake User', 'id': 1},
+            'created_at': '2020-01-01T00:00:00+08:00',
+            'updated_at': '2020-01-01T00:00:00+08:00',
+            'content': '',
+            'cover_photo_info': {'url_template': f'https://i.kfs.io/playlist/{playlist}/fit/{{width}}x{{height}}.{{format}}'},
+            'songs': songs,
+        }
+
+    def handle(self, host, path, params, payload):
+        with self.lock:
+            self.requests[ID_PATTERN.sub('/{id}', path)] += 1
+
+        ok = {'type': 'OK'}
+        if host == 'login':
+            if path == 'check.php' and self.reject_renewals:
+                return {'status': -1}
+            return {'status': 3, 'sid': 'fake-sid', 'lic_content_key': DEFAULT_KEY, 'high_quality': True}
+        if host == 'ticket':
+            return {'status': 1, 'uris': []}
+
+        if path == 'v2/song':
+            return {'status': ok, 'data': {'songs': [self.song(raw_id(id)) for id in payload['ids'].split(',')]}}
+        if path == 'album_more.php':
+            album = int(params['album'])
+            return {'info': self.album(album), 'song_list': {'song': self.album_songs(album)}}
+        if path == 'search_music.php':
+            results = {}
+            for type in params['sf'].split(','):
+                limit = int(params['limit'])
+                items = {
+                    'song': lambda: [self.song(1001 * 100 + i) for i in range(1, limit + 1)],
+                    'album': lambda: [self.album(1000 + i) for i in range(1, limit + 1)],
+                    'artist': lambda: [self.artist_ref(i) for i in range(1, limit + 1)],
+                    'playlist': lambda: [self.playlist(i) for i in range(1, limit + 1)],
+                }[type]()
+                results[f'{type}_list'] = {type: items}
+            return results
+        if path == 'v1/playlists':
+            return {'status': ok, 'data': {'playlists': [self.playlist(raw_id(id)) for id in params['playlist_ids'].split(',')]}}
+
+        match = re.fullmatch(r'v1/album/(\w+)', path)
+        if match:
+            return {'status': ok, 'data': {'album': self.album(raw_id(match.group(1)))}}
+        match = re.fullmatch(r'v3/artist/(\w+)', path)
+        if match:
+            artist = raw_id(match.group(1))
+            return {'status': ok, 'data': {
+                'profile': {'artist_id': artist, 'artist_name': f'Artist {artist}'},
+                'album': self.artist_albums(artist)[:10],
+            }}
+        match = re.fullmatch(r'v2/artist/(\d+)/album', path)
+        if match:
+            offset, limit = int(params['offset']), int(params['limit'])
+            return {'status': ok, 'data': {'album': self.artist_albums(int(match.group(1)))[offset:offset + limit]}}
+        match = re.fullmatch(r'v1/song/(\w+)/lyrics', path)
+        if match:
+            if raw_id(match.group(1)) % 100 > self.tracks_per_album:
+                return {'status': {'type': 'Error'}}
+            lyrics = [{'content': f'line {i}', 'start_time': i * 2500} for i in range(40)]
+            return {'status': ok, 'data': {'lyrics': lyrics}}
+        return None
+
+
+def make_handler(catalog, kc1_key, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self, payload):
+            url = urlparse(self.path)
+            host, _, path = url.path.lstrip('/').partition('/')
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            sleep(latency)
+            resp = catalog.handle(host, path, params, payload)
+            if resp is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            body = ARC4.new(kc1_key).encrypt(json.dumps(resp).encode('utf-8'))
+            self.send_response(200)
+            self.send_header('content-length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.respond(None)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('content-length', 0))).decode('utf-8')
+            if body.startswith('{'):
+                payload = json.loads(body)
+            else:
+                payload = {k: v[0] for k, v in parse_qs(body).items()}
+            self.respond(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8000, latency=0.0, kc1_key=DEFAULT_KEY, albums_per_artist=20, tracks_per_album=12):
+    catalog = FakeCatalog(albums_per_artist, tracks_per_album)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(catalog, kc1_key.encode('ascii'), latency))
+    server.catalog = catalog
+    server.requests = catalog.requests
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the KKBOX API')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--kc1-key', default=DEFAULT_KEY)
+    parser.add_argument('--albums', type=int, default=20, help='albums per artist')
+    parser.add_argument('--tracks', type=int, default=12, help='tracks per album')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.kc1_key, args.albums, args.tracks)
+    print(f'Serving fake KKBOX API on http://127.0.0.1:{args.port}/{{host}}')
+    server.serve_forever()
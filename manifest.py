@@ -0,0 +1,106 @@
+import threading
+from collections import defaultdict
+
+
+class SyncManifest:
+    # sqlite file remembering which albums and playlist tracks earlier runs already downloaded
+    # listings only report what's new, nothing gets recorded until track_done is called for the tracks involved
+    def __init__(self, path, seed=False):
+        import sqlite3
+        # seeding records everything listed straight away, for starting out with a library that's already on disk
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS albums (
+            artist_id TEXT NOT NULL,
+            album_id TEXT NOT NULL,
+            album_date TEXT,
+            PRIMARY KEY (artist_id, album_id)
+        )''')
+        self.db.execute('CREATE TABLE IF NOT EXISTS playlists (playlist_id TEXT PRIMARY KEY, updated_at TEXT)')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS playlist_songs (
+            playlist_id TEXT NOT NULL,
+            song_id TEXT NOT NULL,
+            PRIMARY KEY (playlist_id, song_id)
+        )''')
+        self.db.commit()
+
+        # new albums from artist listings, (artist id, album date) keyed by album id
+        self.new_album_dates = {}
+        # tracks still to be downloaded, keyed by ('album', album id) or ('playlist', playlist id)
+        self.remaining = {}
+        self.playlist_dates = {}
+        self.owners = defaultdict(set)
+
+    def new_albums(self, artist_id, albums):
+        # albums is a list of (encrypted album id, album date), albums whose date changed count as new
+        with self.lock:
+            seen = dict(self.db.execute('SELECT album_id, album_date FROM albums WHERE artist_id = ?', (artist_id,)))
+            new = [id for id, date in albums if id not in seen or seen[id] != date]
+            for id, date in albums:
+                if id not in new:
+                    continue
+                if self.seed:
+                    self.db.execute('INSERT OR REPLACE INTO albums (artist_id, album_id, album_date) VALUES (?, ?, ?)', (artist_id, id, date))
+                else:
+                    self.new_album_dates[id] = (artist_id, date)
+            if self.seed:
+                self.db.commit()
+        return new
+
+    def album_tracks(self, album_id, track_ids):
+        # albums only get recorded once every track of theirs was downloaded
+        with self.lock:
+            if album_id not in self.new_album_dates:
+                return
+            self.watch(('album', album_id), track_ids)
+
+    def new_playlist_tracks(self, playlist_id, updated_at, song_ids):
+        with self.lock:
+            row = self.db.execute('SELECT updated_at FROM playlists WHERE playlist_id = ?', (playlist_id,)).fetchone()
+            if row and updated_at and row[0] == updated_at:
+                return []
+            seen = {song_id for song_id, in self.db.execute('SELECT song_id FROM playlist_songs WHERE playlist_id = ?', (playlist_id,))}
+            new = [id for id in song_ids if id not in seen]
+            if self.seed:
+                self.db.executemany('INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id) VALUES (?, ?)', [(playlist_id, id) for id in new])
+                self.db.execute('INSERT OR REPLACE INTO playlists (playlist_id, updated_at) VALUES (?, ?)', (playlist_id, updated_at))
+                self.db.commit()
+                return new
+            self.playlist_dates[playlist_id] = updated_at
+            self.watch(('playlist', playlist_id), new)
+        return new
+
+    def watch(self, owner, track_ids):
+        # has to be called with the lock held
+        self.remaining[owner] = set(track_ids)
+        for id in track_ids:
+            self.owners[id].add(owner)
+        if not track_ids:
+            self.complete(owner)
+            self.db.commit()
+
+    def track_done(self, track_id):
+        with self.lock:
+            owners = self.owners.pop(track_id, ())
+            for owner in owners:
+                type, id = owner
+                if type == 'playlist':
+                    self.db.execute('INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id) VALUES (?, ?)', (id, track_id))
+                remaining = self.remaining.get(owner)
+                if remaining is not None:
+                    remaining.discard(track_id)
+                    if not remaining:
+                        self.complete(owner)
+            if owners:
+                self.db.commit()
+
+    def complete(self, owner):
+        # has to be called with the lock held, the caller commits
+        type, id = owner
+        del self.remaining[owner]
+        if type == 'album':
+            artist_id, date = self.new_album_dates.pop(id)
+            self.db.execute('INSERT OR REPLACE INTO albums (artist_id, album_id, album_date) VALUES (?, ?, ?)', (artist_id, id, date))
+        else:
+            self.db.execute('INSERT OR REPLACE INTO playlists (playlist_id, updated_at) VALUES (?, ?)', (id, self.playlist_dates.pop(id)))
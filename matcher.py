@@ -0,0 +1,95 @@
+import csv
+import json
+import re
+from difflib import SequenceMatcher
+from .records import artist_lists
+from .workers import ordered_map
+
+PUNCTUATION = re.compile(r'[^\w\s]+')
+BRACKETS = re.compile(r'\s*[\(\[][^\)\]]*[\)\]]')
+
+# how much each field counts towards the confidence score
+WEIGHTS = {'title': 0.5, 'artists': 0.3, 'album': 0.1, 'duration': 0.1}
+
+
+def normalise(text):
+    return ' '.join(PUNCTUATION.sub(' ', text.casefold()).split())
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    # cheap upper bounds first, most candidates are nowhere near the query
+    if matcher.real_quick_ratio() < 0.5 or matcher.quick_ratio() < 0.5:
+        return 0.0
+    return matcher.ratio()
+
+
+def load_tracks(path):
+    # csv files need a header row, artists are separated by semicolons
+    tracks = []
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    for row in rows:
+        artists = row.get('artists') or []
+        if isinstance(artists, str):
+            artists = [a.strip() for a in artists.split(';') if a.strip()]
+        duration = row.get('duration')
+        tracks.append({
+            'title': row['title'],
+            'artists': artists,
+            'album': row.get('album') or '',
+            'duration': float(duration) if duration not in (None, '') else None,
+        })
+    return tracks
+
+
+class TrackMatcher:
+    def __init__(self, search, workers, limit=10):
+        # search takes (query, limit) and returns a raw search_music.php response
+        self.search = search
+        self.workers = workers
+        self.limit = limit
+
+    def score(self, track, song):
+        title = normalise(BRACKETS.sub('', track['title'])) or normalise(track['title'])
+        song_title = normalise(BRACKETS.sub('', song['song_name'])) or normalise(song['song_name'])
+
+        song_artists = artist_lists(song.get('artist_role', {}))[0] or [song.get('artist_name', '')]
+        song_artists = normalise(' '.join(song_artists))
+        artists = normalise(' '.join(track['artists']))
+
+        scores = {'title': similarity(title, song_title)}
+        if artists and song_artists:
+            scores['artists'] = similarity(artists, song_artists)
+        if track['album'] and song.get('album_name'):
+            scores['album'] = similarity(normalise(track['album']), normalise(song['album_name']))
+        if track['duration'] and song.get('song_length'):
+            diff = abs(track['duration'] - float(song['song_length']))
+            scores['duration'] = max(0.0, 1 - diff / 10)
+
+        # fields missing on either side don't count against the candidate
+        total = sum(WEIGHTS[field] for field in scores)
+        return sum(WEIGHTS[field] * score for field, score in scores.items()) / total
+
+    def match(self, track):
+        query = ' '.join([*track['artists'][:1], track['title']])
+        songs = self.search(query, self.limit).get('song_list', {}).get('song', [])
+
+        best_id, best_score = None, 0.0
+        for song in songs:
+            score = self.score(track, song)
+            if score > best_score:
+                best_id, best_score = song['song_more_url'].split('/')[-1], score
+
+        return {**track, 'id': best_id, 'confidence': round(best_score, 3)}
+
+    def match_all(self, tracks):
+        return ordered_map(self.match, tracks, self.workers)
@@ -0,0 +1,81 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+ID_PATTERN = re.compile(r'/(?:\d+|[a-zA-Z0-9-_]{18})(?=/|$)')
+
+
+def endpoint_name(path):
+    # collapses ids in paths so that e.g. every v1/song/{id}/lyrics call is counted together
+    return ID_PATTERN.sub('/{id}', path)
+
+
+class Metrics:
+    def __init__(self):
+        self.hooks = []
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.cache_hits = Counter()
+        self.cache_misses = Counter()
+        self.errors = Counter()
+        self.bytes = Counter()
+        self.seconds = defaultdict(float)
+
+    def add_hook(self, hook):
+        # hooks get called with a dict describing every api call, see KkboxAPI.api_call for the fields
+        self.hooks.append(hook)
+
+    def record(self, event):
+        endpoint = event['endpoint']
+        with self.lock:
+            if event['cached'] is not None:
+                (self.cache_hits if event['cached'] else self.cache_misses)[endpoint] += 1
+            if not event['cached']:
+                self.requests[endpoint] += 1
+                self.bytes[endpoint] += event['bytes']
+                self.seconds[endpoint] += event['total_time']
+            if event['error']:
+                self.errors[endpoint] += 1
+
+        # a broken hook shouldn't take the api call down with it
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                print(f'KKBOX: metrics hook {getattr(hook, "__name__", hook)} failed: {e!r}')
+
+    def prometheus_text(self):
+        lines = []
+        for name, kind, values in (
+            ('kkbox_requests_total', 'counter', self.requests),
+            ('kkbox_cache_hits_total', 'counter', self.cache_hits),
+            ('kkbox_cache_misses_total', 'counter', self.cache_misses),
+            ('kkbox_errors_total', 'counter', self.errors),
+            ('kkbox_response_bytes_total', 'counter', self.bytes),
+            ('kkbox_request_seconds_total', 'counter', self.seconds),
+        ):
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, value in sorted(values.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def opentelemetry_hook(tracer=None):
+    from opentelemetry import trace
+
+    tracer = tracer or trace.get_tracer('orpheusdl-kkbox')
+
+    def hook(event):
+        span = tracer.start_span(f'kkbox {event["endpoint"]}', start_time=event['start_ns'], attributes={
+            'kkbox.host': event['host'],
+            'kkbox.path': event['path'],
+            'kkbox.cached': bool(event['cached']),
+            'http.status_code': event['status'] or 0,
+            'kkbox.bytes': event['bytes'],
+            'kkbox.decrypt_time': event['decrypt_time'],
+            'kkbox.parse_time': event['parse_time'],
+            'kkbox.error': event['error'] or '',
+        })
+        span.end(end_time=event['start_ns'] + int(event['total_time'] * 1e9))
+
+    return hook
@@ -0,0 +1,106 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from itertools import count
+from time import perf_counter, thread_time
+
+# entry points orpheusdl calls on the module, these become the stages in the report
+PROFILED_METHODS = (
+    'custom_url_parse',
+    'get_artist_info',
+    'get_album_info',
+    'get_playlist_info',
+    'get_track_info',
+    'get_track_download',
+    'get_track_cover',
+    'get_track_lyrics',
+    'search',
+)
+
+instance_ids = count(1)
+
+
+class Profiler:
+    # per stage wall and cpu time plus memory, written out as a json report and a collapsed stack file for flamegraphs
+    def __init__(self, path, metrics=None):
+        self.path = path
+        self.metrics = metrics
+        self.id = next(instance_ids)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stages = defaultdict(lambda: {'calls': 0, 'wall': 0.0, 'self_wall': 0.0, 'cpu': 0.0, 'allocated': 0})
+        self.collapsed = Counter()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        atexit.register(self.write_report)
+
+    def instrument(self, obj, names=PROFILED_METHODS):
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = getattr(self.local, 'stack', None)
+            if stack is None:
+                stack = self.local.stack = []
+            # each frame is [name, time spent in nested stages]
+            stack.append([name, 0.0])
+            path = ';'.join(frame[0] for frame in stack)
+
+            memory = tracemalloc.get_traced_memory()[0]
+            cpu = thread_time()
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall = perf_counter() - start
+                cpu = thread_time() - cpu
+                memory = tracemalloc.get_traced_memory()[0] - memory
+                _, child_wall = stack.pop()
+                if stack:
+                    stack[-1][1] += wall
+
+                with self.lock:
+                    stage = self.stages[name]
+                    stage['calls'] += 1
+                    stage['wall'] += wall
+                    stage['self_wall'] += wall - child_wall
+                    stage['cpu'] += cpu
+                    stage['allocated'] += memory
+                    self.collapsed[path] += int((wall - child_wall) * 1e6)
+
+        return wrapper
+
+    def write_report(self):
+        os.makedirs(self.path, exist_ok=True)
+        base = os.path.join(self.path, f'kkbox-profile-{os.getpid()}-{self.id}')
+
+        snapshot = tracemalloc.take_snapshot()
+        top_allocations = [
+            {'location': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:25]
+        ]
+        current, peak = tracemalloc.get_traced_memory()
+        metrics = self.metrics() if self.metrics else None
+
+        with self.lock:
+            report = {
+                'stages': dict(self.stages),
+                'memory': {'current': current, 'peak': peak, 'top_allocations': top_allocations},
+                'requests': dict(metrics.requests) if metrics else {},
+                'cache_hits': dict(metrics.cache_hits) if metrics else {},
+                'cache_misses': dict(metrics.cache_misses) if metrics else {},
+                'errors': dict(metrics.errors) if metrics else {},
+            }
+            collapsed = '\n'.join(f'{path} {us}' for path, us in sorted(self.collapsed.items()))
+
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            f.write(collapsed + '\n')
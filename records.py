@@ -0,0 +1,42 @@
+def artist_lists(artist_role):
+    # songs either come with mainartists/featuredartists lists or the older mainartist_list/featuredartist_list shape
+    main_artists = artist_role.get('mainartists', [])
+    if 'mainartist_list' in artist_role:
+        main_artists = artist_role['mainartist_list']['mainartist']
+    featured_artists = artist_role.get('featuredartists', [])
+    if 'featuredartist_list' in artist_role:
+        featured_artists = artist_role['featuredartist_list']['featuredartist']
+    return main_artists, featured_artists
+
+
+class Song:
+    # only the fields read when building track, cover and lyrics info, so the raw api dicts can be dropped early
+    __slots__ = (
+        'id',
+        'name',
+        'track_number',
+        'genre',
+        'main_artists',
+        'featured_artists',
+        'audio_quality',
+        'url_template',
+        'explicit',
+        'album_id',
+        'has_lyrics',
+    )
+
+    def __init__(self, raw):
+        # works with songs from v2/song, album_more.php, v1/playlists and search_music.php
+        main_artists, featured_artists = artist_lists(raw['artist_role'])
+
+        self.id = raw['song_more_url'].split('/')[-1]
+        self.name = raw.get('song_name') or raw['text']
+        self.track_number = int(raw['song_idx'])
+        self.genre = raw['genre_name']
+        self.main_artists = tuple(main_artists)
+        self.featured_artists = tuple(featured_artists)
+        self.audio_quality = tuple(raw['audio_quality'])
+        self.url_template = raw['album_photo_info']['url_template']
+        self.explicit = bool(raw['song_is_explicit'])
+        self.album_id = raw.get('raw_album_id') or (int(raw['album_id']) if raw.get('album_id') else None)
+        self.has_lyrics = not (raw.get('is_lyrics') == False or raw.get('song_lyrics_valid') == 0)
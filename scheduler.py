@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+from random import uniform
+from time import monotonic, sleep
+
+
+class TransientError(Exception):
+    pass
+
+
+class RequestScheduler:
+    # token bucket rate limit, retries with jittered exponential backoff, and a circuit breaker
+    # that pauses every caller for a while once too many recent requests failed
+    def __init__(self, rate=0, max_retries=3, breaker_cooldown=30, breaker_threshold=0.5, breaker_window=20):
+        # RetryError comes from sessions whose adapters retry on 429 and 5xx responses themselves
+        from requests.exceptions import ConnectionError, RetryError, Timeout
+        self.transient = (TransientError, ConnectionError, RetryError, Timeout)
+
+        self.rate = rate
+        # rates below one request per second still need room for a whole token
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.last_refill = monotonic()
+        self.max_retries = max_retries
+
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_threshold = breaker_threshold
+        self.outcomes = deque(maxlen=breaker_window)
+        self.open_until = 0.0
+
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+    def wait_for_breaker(self):
+        while True:
+            with self.lock:
+                wait = self.open_until - monotonic()
+            if wait <= 0:
+                return
+            sleep(wait)
+
+    def record(self, success):
+        with self.lock:
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) == self.outcomes.maxlen and failures / len(self.outcomes) >= self.breaker_threshold:
+                self.open_until = monotonic() + self.breaker_cooldown
+                # start counting again once the breaker closes
+                self.outcomes.clear()
+
+    def run(self, func):
+        attempt = 0
+        while True:
+            self.wait_for_breaker()
+            self.acquire()
+            try:
+                result = func()
+            except self.transient:
+                self.record(False)
+                if attempt >= self.max_retries:
+                    raise
+                sleep(uniform(0, min(30, 0.5 * 2 ** attempt)))
+                attempt += 1
+                continue
+            self.record(True)
+            return result
@@ -0,0 +1,95 @@
+import importlib
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+REPO = Path(__file__).resolve().parents[1]
+# orpheusdl itself (for utils) is two levels up when the repo sits at modules/kkbox
+sys.path.insert(0, str(REPO.parents[1]))
+# the repo gets imported as a package named kkbox whatever its folder is called
+if 'kkbox' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('kkbox', REPO / '__init__.py', submodule_search_locations=[str(REPO)])
+    sys.modules['kkbox'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['kkbox'])
+
+from kkbox.kkfake import DEFAULT_KEY, serve
+
+# added to every fake response, so request counts show up in wall time too
+LATENCY = 0.002
+
+
+@pytest.fixture(scope='session')
+def fake_api():
+    server = serve(0, LATENCY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def api_url(fake_api):
+    return f'http://127.0.0.1:{fake_api.server_address[1]}/{{host}}'
+
+
+@pytest.fixture
+def api(api_url):
+    import requests
+    from kkbox.kkapi import KkboxAPI
+    api = KkboxAPI(Exception, DEFAULT_KEY, DEFAULT_KEY, session=requests.Session(), api_url=api_url)
+    api.set_credentials('user@example.com', 'password')
+    return api
+
+
+@pytest.fixture(scope='session')
+def interface():
+    # the module interface needs orpheusdl's utils package
+    pytest.importorskip('utils.models')
+    return importlib.import_module('kkbox.interface')
+
+
+class TemporarySettings(dict):
+    def read(self, key):
+        return self.get(key)
+
+    def set(self, key, value):
+        self[key] = value
+
+
+@pytest.fixture
+def make_module(interface, fake_api, api_url):
+    from utils.models import ImageFileTypeEnum, QualityEnum
+
+    def make_module(login=True, tsc=None, **settings):
+        module_settings = dict(interface.module_information.global_settings)
+        module_settings.update(
+            kc1_key = DEFAULT_KEY,
+            secret_key = DEFAULT_KEY,
+            api_url = api_url,
+            email = 'user@example.com',
+            password = 'password',
+        )
+        module_settings.update(settings)
+        controller = SimpleNamespace(
+            module_settings = module_settings,
+            module_error = Exception,
+            temporary_settings_controller = tsc if tsc is not None else TemporarySettings(),
+            orpheus_options = SimpleNamespace(
+                default_cover_options = SimpleNamespace(file_type=ImageFileTypeEnum.jpg, resolution=1400),
+                disable_subscription_check = False,
+                quality_tier = QualityEnum.LOSSLESS,
+            ),
+        )
+        module = interface.ModuleInterface(controller)
+        if login:
+            module.login(module_settings['email'], module_settings['password'])
+            # logging in is put off until something needs a session, tests want it out of the way
+            module.session.ensure_session()
+        # request counts in tests start once the module is set up
+        fake_api.requests.clear()
+        return module
+
+    return make_module
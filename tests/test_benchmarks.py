@@ -0,0 +1,58 @@
+# entry point timings against kkfake, every round gets a fresh module so nothing is served from memory
+# request counts are asserted as well, a regression there usually shows up long before it shows up in wall time
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+ALBUM = 'A00000000000001003'
+ARTIST = 'R00000000000000001'
+PLAYLIST = 'P00000000000000001'
+
+
+@pytest.fixture
+def run(benchmark, make_module, fake_api):
+    def run(func, rounds=5):
+        benchmark.pedantic(func, setup=lambda: ((make_module(),), {}), rounds=rounds)
+        # counts from the last round only, they get reset whenever a module is made
+        return dict(fake_api.requests)
+
+    return run
+
+
+def test_get_album_info(run):
+    assert run(lambda module: module.get_album_info(ALBUM)) == {'v1/album/{id}': 1, 'album_more.php': 1}
+
+
+def test_get_playlist_info(run):
+    assert run(lambda module: module.get_playlist_info(PLAYLIST)) == {'v1/playlists': 1}
+
+
+def test_get_artist_info(run):
+    assert run(lambda module: module.get_artist_info(ARTIST, False)) == {'v3/artist/{id}': 1, 'v2/artist/{id}/album': 1}
+
+
+def test_artist_albums(run):
+    # raw album ids come with the artist listing, so there's no v1/album lookup per album
+    requests = run(lambda module: list(module.iter_artist_albums(ARTIST, False)))
+    assert requests == {'v3/artist/{id}': 1, 'v2/artist/{id}/album': 1, 'album_more.php': 20}
+
+
+def test_search(run):
+    from utils.models import DownloadTypeEnum
+
+    def search(module):
+        for type in (DownloadTypeEnum.track, DownloadTypeEnum.album, DownloadTypeEnum.artist, DownloadTypeEnum.playlist):
+            module.search(type, 'song')
+
+    # every type comes back from the same request
+    assert run(search) == {'search_music.php': 1}
+
+
+def test_search_hits_resolve_together(run):
+    from utils.models import DownloadTypeEnum, QualityEnum
+
+    def resolve(module):
+        for result in module.search(DownloadTypeEnum.track, 'song'):
+            module.get_track_info(result.result_id, QualityEnum.LOSSLESS, None)
+
+    assert run(resolve) == {'search_music.php': 1, 'v2/song': 1, 'album_more.php': 1}
@@ -0,0 +1,138 @@
+import threading
+import time
+
+from kkbox import cache
+from kkbox.cache import BoundedDict, MemoCache, MetadataCache
+
+
+def test_metadata_cache_roundtrip(tmp_path):
+    store = MetadataCache(str(tmp_path / 'cache.db'), 1024 * 1024)
+    key = store.make_key('album_more.php', {'album': 1}, None)
+    assert store.get(key, 60) is None
+    store.set(key, {'info': {'album_name': 'Album 1'}})
+    assert store.get(key, 60) == {'info': {'album_name': 'Album 1'}}
+
+
+def test_metadata_cache_key_ignores_param_order():
+    assert MetadataCache.make_key('v1/playlists', {'a': 1, 'b': 2}, None) == MetadataCache.make_key('v1/playlists', {'b': 2, 'a': 1}, None)
+
+
+def test_metadata_cache_expiry(tmp_path, monkeypatch):
+    store = MetadataCache(str(tmp_path / 'cache.db'), 1024 * 1024)
+    store.set('key', {'value': 1})
+    now = time.time()
+    monkeypatch.setattr(cache, 'time', lambda: now + 120)
+    assert store.get('key', 60) is None
+
+
+def test_metadata_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    value = {'value': 'x' * 100}
+    store = MetadataCache(str(tmp_path / 'cache.db'), 250)
+    clock = iter(range(100))
+    monkeypatch.setattr(cache, 'time', lambda: next(clock))
+    store.set('a', value)
+    store.set('b', value)
+    store.get('a', 60)
+    store.set('c', value)
+    assert store.get('a', 60) == value
+    assert store.get('b', 60) is None
+    assert store.get('c', 60) == value
+
+
+def test_metadata_cache_refresh(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    MetadataCache(path, 1024).set('key', {'value': 1})
+    assert MetadataCache(path, 1024, refresh=True).get('key', 60) is None
+
+
+def test_metadata_cache_keeps_a_running_total(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    store = MetadataCache(path, 1024 * 1024)
+    store.set('a', {'value': 'x' * 100})
+    store.set('b', {'value': 'x' * 100})
+    store.set('a', {'value': 'x'})
+    assert store.total == store.db.execute('SELECT SUM(size) FROM responses').fetchone()[0]
+    assert MetadataCache(path, 1024 * 1024).total == store.total
+
+
+def test_metadata_cache_batches_access_times(tmp_path, monkeypatch):
+    store = MetadataCache(str(tmp_path / 'cache.db'), 1024 * 1024)
+    monkeypatch.setattr(cache, 'time', lambda: 1.0)
+    keys = [str(i) for i in range(cache.ACCESS_FLUSH_SIZE)]
+    for key in keys:
+        store.set(key, {'value': 1})
+    monkeypatch.setattr(cache, 'time', lambda: 2.0)
+    accessed = lambda: {row[0] for row in store.db.execute('SELECT accessed FROM responses')}
+    for key in keys[:-1]:
+        store.get(key, 60)
+    assert accessed() == {1.0}
+    store.get(keys[-1], 60)
+    assert accessed() == {2.0}
+
+
+def test_memo_cache_single_flight():
+    memo = MemoCache(16)
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(None)
+        release.wait(5)
+        return {'value': 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(memo.get('key', fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+
+
+def test_memo_cache_failed_call_is_retried():
+    memo = MemoCache(16)
+
+    def fail():
+        raise ValueError
+
+    try:
+        memo.get('key', fail)
+    except ValueError:
+        pass
+    assert memo.get('key', lambda: 1) == 1
+
+
+def test_memo_cache_bounded():
+    memo = MemoCache(2)
+    for key in 'abc':
+        memo.get(key, lambda: key)
+    assert memo.peek('a') is None
+    assert memo.peek('c') == 'c'
+
+
+def test_memo_cache_ttl(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(cache, 'time', lambda: now)
+    expiring = MemoCache(16, 60)
+    forever = MemoCache(16, None)
+    expiring.get('key', lambda: 1)
+    forever.get('key', lambda: 1)
+
+    monkeypatch.setattr(cache, 'time', lambda: now + 3600)
+    assert expiring.peek('key') is None
+    assert forever.peek('key') == 1
+
+
+def test_bounded_dict():
+    songs = BoundedDict(2)
+    songs['a'] = 1
+    songs['b'] = 2
+    songs.get('a')
+    songs.update({'c': 3})
+    assert list(songs) == ['a', 'c']
+    assert songs.get('b') is None
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+from kkbox.catalog import Catalog
+from kkbox.kkfake import FakeCatalog
+
+ALBUM = 'A00000000000001003'
+
+
+def album_more(album):
+    fake = FakeCatalog()
+    return {'info': fake.album(album), 'song_list': {'song': fake.album_songs(album)}}
+
+
+class NoFts5:
+    # sqlite connection that behaves like a build without fts5
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sql, *args):
+        if 'fts5' in sql:
+            raise sqlite3.OperationalError('no such module: fts5')
+        return self.db.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+@pytest.fixture(params=['fts5', 'like'])
+def catalog(request, tmp_path, monkeypatch):
+    if request.param == 'like':
+        connect = sqlite3.connect
+        monkeypatch.setattr(sqlite3, 'connect', lambda *args, **kwargs: NoFts5(connect(*args, **kwargs)))
+    catalog = Catalog(str(tmp_path / 'catalog.db'))
+    assert catalog.fts == (request.param == 'fts5')
+    return catalog
+
+
+def test_index_and_raw_id(catalog):
+    catalog.index(album_more(1003))
+    assert catalog.raw_id('album', ALBUM) == '1003'
+    assert catalog.raw_id('song', 'S00000000000100301') == '100301'
+    assert catalog.raw_id('album', 'A00000000000001004') is None
+
+
+def test_reindexing_keeps_one_row(catalog):
+    catalog.index(album_more(1003))
+    catalog.index(album_more(1003))
+    assert len(catalog.search('song', 'Song 100301', 10)) == 1
+    assert len(catalog.search('album', 'Album 1003', 10)) == 1
+
+
+def test_search(catalog):
+    catalog.index(album_more(1003))
+    catalog.index(album_more(1004))
+    songs = catalog.search('song', 'song 100305', 10)
+    assert [song['song_name'] for song in songs] == ['Song 100305']
+    # every word has to match, in any of title, artist or album
+    assert len(catalog.search('song', 'Album 1004 Artist', 20)) == 12
+    assert len(catalog.search('song', 'Song', 5)) == 5
+    assert [album['album_name'] for album in catalog.search('album', 'Album 1003', 10)] == ['Album 1003']
+    assert catalog.search('song', 'nothing', 10) == []
+    assert catalog.search('song', '  ', 10) == []
+
+
+def test_search_reads_local_index_first(make_module, fake_api, tmp_path):
+    from utils.models import DownloadTypeEnum
+    module = make_module(catalog_path=str(tmp_path / 'catalog.db'), search_cache_ttl=0)
+
+    # nothing indexed yet, so the server gets asked and its results indexed
+    assert len(module.search(DownloadTypeEnum.track, 'Song', limit=10)) == 10
+    assert fake_api.requests == {'search_music.php': 1}
+
+    fake_api.requests.clear()
+    assert len(module.search(DownloadTypeEnum.track, 'Song', limit=10)) == 10
+    assert not fake_api.requests
+
+    # an album only has 12 songs, not enough for a page of 20
+    module.get_album_info(ALBUM)
+    fake_api.requests.clear()
+    assert len(module.search(DownloadTypeEnum.track, 'Album 1003', limit=20)) == 20
+    assert fake_api.requests == {'search_music.php': 1}
+
+
+def test_album_ids_resolve_from_the_catalog(make_module, fake_api, tmp_path):
+    module = make_module(catalog_path=str(tmp_path / 'catalog.db'))
+    module.session.catalog.index(album_more(1003))
+    module.get_album_info(ALBUM)
+    assert fake_api.requests == {'album_more.php': 1}
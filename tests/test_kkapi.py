@@ -0,0 +1,65 @@
+import pytest
+import requests
+
+from kkbox.cache import MetadataCache
+from kkbox.kkapi import KkboxAPI
+from kkbox.kkfake import DEFAULT_KEY
+from kkbox.scheduler import RequestScheduler
+
+
+class ModuleError(Exception):
+    pass
+
+
+def test_responses_are_decrypted(api):
+    songs = api.get_songs(['S00000000000100101', 'S00000000000100102'])
+    assert [song['song_name'] for song in songs] == ['Song 100101', 'Song 100102']
+    assert dict(api.metrics.requests) == {'login.php': 1, 'v2/song': 1}
+
+
+def test_cached_responses(api, tmp_path):
+    api.cache = MetadataCache(str(tmp_path / 'cache.db'), 1024 * 1024)
+    first = api.get_album_more(1003)
+    assert api.get_album_more(1003) == first
+    assert api.metrics.requests['album_more.php'] == 1
+    assert api.metrics.cache_hits['album_more.php'] == 1
+
+
+def test_failed_requests_raise_module_errors():
+    events = []
+    api = KkboxAPI(
+        ModuleError, DEFAULT_KEY, DEFAULT_KEY,
+        session = requests.Session(),
+        api_url = 'http://127.0.0.1:1/{host}',
+        scheduler = RequestScheduler(max_retries=0),
+    )
+    api.metrics.add_hook(events.append)
+
+    with pytest.raises(ModuleError):
+        api.get_album_more(1003)
+    assert events[-1]['error'] == 'ConnectionError'
+    assert events[-1]['total_time'] > 0
+    assert api.metrics.errors['album_more.php'] == 1
+
+
+def test_only_successful_responses_are_cached(api, tmp_path):
+    api.cache = MetadataCache(str(tmp_path / 'cache.db'), 1024 * 1024)
+    # kkfake has no lyrics for songs past the end of their album
+    for id in ('S00000000000100101', 'S00000000000100199'):
+        for _ in range(2):
+            api.get_song_lyrics(id)
+    assert api.metrics.requests['v1/song/{id}/lyrics'] == 3
+    assert api.metrics.cache_hits['v1/song/{id}/lyrics'] == 1
+
+
+def test_failing_hooks_are_skipped(api, capsys):
+    events = []
+
+    def broken(event):
+        raise ValueError('broken')
+
+    api.metrics.add_hook(broken)
+    api.metrics.add_hook(events.append)
+    assert api.get_album_more(1003)['info']['album_id'] == 1003
+    assert [event['endpoint'] for event in events] == ['login.php', 'album_more.php']
+    assert 'metrics hook broken failed' in capsys.readouterr().out
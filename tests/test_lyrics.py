@@ -0,0 +1,8 @@
+def test_synced_lyrics_use_centiseconds(make_module):
+    lyrics = make_module().get_track_lyrics('S00000000000100101')
+    synced = lyrics.synced.splitlines()
+    # kkfake lines start every 2.5 seconds
+    assert synced[0] == '[00:00.00]line 0'
+    assert synced[1] == '[00:02.50]line 1'
+    assert synced[25] == '[01:02.50]line 25'
+    assert lyrics.embedded.splitlines()[1] == 'line 1'
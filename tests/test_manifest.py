@@ -0,0 +1,73 @@
+from kkbox.manifest import SyncManifest
+
+ALBUMS = [('A1', '2020-01-01'), ('A2', '2021-01-01')]
+
+
+def test_albums_recorded_once_downloaded(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    manifest = SyncManifest(path)
+    assert manifest.new_albums('R1', ALBUMS) == ['A1', 'A2']
+    manifest.album_tracks('A1', ['S1', 'S2'])
+    manifest.album_tracks('A2', ['S3'])
+    manifest.track_done('S1')
+    manifest.track_done('S2')
+
+    # A2 never finished, so the next run still has to go through it
+    assert SyncManifest(path).new_albums('R1', ALBUMS) == ['A2']
+
+
+def test_listing_alone_records_nothing(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    SyncManifest(path).new_albums('R1', ALBUMS)
+    assert SyncManifest(path).new_albums('R1', ALBUMS) == ['A1', 'A2']
+
+
+def test_changed_album_date_counts_as_new(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    manifest = SyncManifest(path)
+    manifest.new_albums('R1', ALBUMS[:1])
+    manifest.album_tracks('A1', [])
+    assert SyncManifest(path).new_albums('R1', [('A1', '2020-06-01')]) == ['A1']
+
+
+def test_playlist_tracks(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    manifest = SyncManifest(path)
+    assert manifest.new_playlist_tracks('P1', 'v1', ['S1', 'S2', 'S3']) == ['S1', 'S2', 'S3']
+    manifest.track_done('S1')
+
+    manifest = SyncManifest(path)
+    assert manifest.new_playlist_tracks('P1', 'v1', ['S1', 'S2', 'S3']) == ['S2', 'S3']
+    manifest.track_done('S2')
+    manifest.track_done('S3')
+
+    # unchanged playlists are skipped outright, changed ones only return the tracks that were added
+    assert SyncManifest(path).new_playlist_tracks('P1', 'v1', ['S1', 'S2', 'S3']) == []
+    assert SyncManifest(path).new_playlist_tracks('P1', 'v2', ['S1', 'S2', 'S3', 'S4']) == ['S4']
+
+
+def test_seeding_records_listings(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    seeding = SyncManifest(path, seed=True)
+    assert seeding.new_albums('R1', ALBUMS) == ['A1', 'A2']
+    assert seeding.new_playlist_tracks('P1', 'v1', ['S1', 'S2']) == ['S1', 'S2']
+
+    manifest = SyncManifest(path)
+    assert manifest.new_albums('R1', ALBUMS) == []
+    assert manifest.new_playlist_tracks('P1', 'v1', ['S1', 'S2']) == []
+
+
+def test_tracks_with_errors_count_as_done(make_module, tmp_path):
+    from utils.models import QualityEnum
+
+    path = str(tmp_path / 'manifest.db')
+    module = make_module(sync_manifest_path=path)
+    artist = module.get_artist_info('R00000000000000001', False)
+    album = module.get_album_info(artist.albums[0], **artist.album_extra_kwargs)
+
+    # orpheusdl never asks for downloads of tracks that come back with an error
+    module.session.available_qualities = ['128k']
+    for track_id in album.tracks:
+        assert module.get_track_info(track_id, QualityEnum.LOSSLESS, None, **album.track_extra_kwargs).error
+
+    assert artist.albums[0] not in make_module(sync_manifest_path=path).get_artist_info('R00000000000000001', False).albums
@@ -0,0 +1,65 @@
+import json
+
+from kkbox.matcher import TrackMatcher, load_tracks, normalise, similarity
+
+
+def song(id, name, artists, album='', length=None, flat=False):
+    return {
+        'song_more_url': f'https://play.kkbox.com/song/{id}',
+        'song_name': name,
+        'artist_role': {'mainartists': artists} if flat else {'mainartist_list': {'mainartist': artists}},
+        'album_name': album,
+        'song_length': length,
+    }
+
+
+def test_normalise():
+    assert normalise('  Hello,   World! ') == 'hello world'
+
+
+def test_similarity():
+    assert similarity('abc', 'abc') == 1.0
+    assert similarity('', 'abc') == 0.0
+    assert similarity('hello world', 'zzzzzzzzzzzzzzzzzzzz') == 0.0
+
+
+def test_load_tracks(tmp_path):
+    csv_path = tmp_path / 'tracks.csv'
+    csv_path.write_text('title,artists,album,duration\nSong,A; B,Album,200\nOther,,,\n', encoding='utf-8')
+    jsonl_path = tmp_path / 'tracks.jsonl'
+    jsonl_path.write_text(json.dumps({'title': 'Song', 'artists': ['A', 'B'], 'album': 'Album', 'duration': 200}) + '\n', encoding='utf-8')
+
+    tracks = load_tracks(str(csv_path))
+    assert tracks[0] == {'title': 'Song', 'artists': ['A', 'B'], 'album': 'Album', 'duration': 200.0}
+    assert tracks[1] == {'title': 'Other', 'artists': [], 'album': '', 'duration': None}
+    assert load_tracks(str(jsonl_path)) == tracks[:1]
+
+
+def test_match_picks_best_candidate():
+    songs = [
+        song('S1', 'Song (Live)', ['Someone Else'], length=300),
+        song('S2', 'Song', ['Artist'], 'Album', 200, flat=True),
+    ]
+    queries = []
+
+    def search(query, limit):
+        queries.append(query)
+        return {'song_list': {'song': songs}}
+
+    track = {'title': 'Song', 'artists': ['Artist'], 'album': 'Album', 'duration': 201.0}
+    [match] = TrackMatcher(search, 2).match_all([track])
+    assert queries == ['Artist Song']
+    assert match['id'] == 'S2'
+    assert 0.9 < match['confidence'] <= 1.0
+
+
+def test_match_without_results():
+    matcher = TrackMatcher(lambda query, limit: {}, 1)
+    assert matcher.match({'title': 'Song', 'artists': [], 'album': '', 'duration': None})['id'] is None
+
+
+def test_missing_fields_are_left_out():
+    matcher = TrackMatcher(None, 1)
+    track = {'title': 'Song', 'artists': [], 'album': '', 'duration': None}
+    assert matcher.score(track, song('S1', 'Song', ['Artist'], 'Album', 200)) == 1.0
+    assert matcher.score({**track, 'artists': ['Artist']}, song('S1', 'Song', [])) == 1.0
@@ -0,0 +1,20 @@
+from kkbox.kkfake import enc_id
+
+# 45 playlists in batches of 20 take 3 requests, each one shares 50 songs with the next
+PLAYLISTS = [enc_id('P', i) for i in range(1, 46)]
+
+
+def test_iter_playlists_batches_requests(api):
+    playlists = list(api.iter_playlists(PLAYLISTS))
+    assert [playlist['id'] for playlist in playlists] == PLAYLISTS
+    assert api.metrics.requests['v1/playlists'] == 3
+
+
+def test_shared_tracks_come_up_once(make_module, fake_api):
+    module = make_module()
+    pairs = list(module.iter_playlist_tracks(PLAYLISTS))
+    ids = [id for _, id in pairs]
+    assert len(ids) == len(set(ids)) == 100 + 44 * 50
+    # shared tracks belong to the first playlist listing them
+    assert [id for playlist, id in pairs if playlist == PLAYLISTS[1]] == ids[100:150]
+    assert fake_api.requests == {'v1/playlists': 3}
@@ -0,0 +1,86 @@
+import pytest
+
+from kkbox import scheduler
+from kkbox.scheduler import RequestScheduler, TransientError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(scheduler, 'sleep', lambda seconds: None)
+
+
+def flaky(failures, exception=TransientError):
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise exception('failed')
+        return 'ok'
+
+    return func, calls
+
+
+def test_retries_transient_errors():
+    func, calls = flaky(2)
+    assert RequestScheduler(max_retries=3).run(func) == 'ok'
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_retries():
+    func, calls = flaky(5)
+    with pytest.raises(TransientError):
+        RequestScheduler(max_retries=2).run(func)
+    assert len(calls) == 3
+
+
+def test_connection_errors_are_transient():
+    from requests.exceptions import ConnectionError, RetryError
+    for exception in (ConnectionError, RetryError):
+        func, calls = flaky(1, exception)
+        assert RequestScheduler().run(func) == 'ok'
+
+
+def test_other_errors_are_not_retried():
+    func, calls = flaky(1, ValueError)
+    with pytest.raises(ValueError):
+        RequestScheduler().run(func)
+    assert len(calls) == 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # sleeping just moves the clock forward, the waits are kept for checking
+    clock = {'now': 0.0, 'waits': []}
+
+    def sleep(seconds):
+        clock['waits'].append(seconds)
+        clock['now'] += seconds
+
+    monkeypatch.setattr(scheduler, 'monotonic', lambda: clock['now'])
+    monkeypatch.setattr(scheduler, 'sleep', sleep)
+    return clock
+
+
+def test_rate_limit(clock):
+    bucket = RequestScheduler(rate=2)
+    for _ in range(4):
+        bucket.acquire()
+    # two requests fit in the bucket straight away, the rest are spaced out
+    assert clock['waits'] == pytest.approx([0.5, 0.5])
+
+
+def test_fractional_rate(clock):
+    bucket = RequestScheduler(rate=0.5)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock['waits'] == pytest.approx([2.0])
+
+
+def test_breaker_opens_after_failures():
+    bucket = RequestScheduler(max_retries=0, breaker_window=4, breaker_threshold=0.5, breaker_cooldown=30)
+    for _ in range(4):
+        with pytest.raises(TransientError):
+            bucket.run(flaky(1)[0])
+    assert bucket.open_until > scheduler.monotonic()
+    assert not bucket.outcomes
@@ -0,0 +1,51 @@
+from time import time
+
+ALBUM = 'A00000000000001003'
+
+
+def restart(make_module, tsc, **settings):
+    # a later run, orpheusdl logs in again without new_login when a session was stored
+    module = make_module(login=False, tsc=tsc, **settings)
+    module.login('user@example.com', 'password', new_login=False)
+    return module
+
+
+def test_stored_session_skips_login(make_module, fake_api):
+    module = restart(make_module, make_module().tsc)
+    module.get_album_info(ALBUM)
+    assert 'login.php' not in fake_api.requests
+    assert 'check.php' not in fake_api.requests
+
+
+def test_expiring_session_gets_renewed(make_module, fake_api, capsys):
+    tsc = make_module().tsc
+    tsc.set('session_expiry', int(time()) + 60)
+    module = restart(make_module, tsc)
+    module.curr_quality = 'unavailable'
+    module.get_album_info(ALBUM)
+    module.get_album_info('A00000000000001004')
+    assert fake_api.requests['check.php'] == 1
+    assert 'login.php' not in fake_api.requests
+    assert tsc.read('session_expiry') > time() + 3600
+    # the subscription warning is only for real logins
+    assert capsys.readouterr().out == ''
+
+
+def test_failed_renewal_logs_in_again(make_module, fake_api, monkeypatch, capsys):
+    tsc = make_module().tsc
+    tsc.set('session_expiry', int(time()) + 60)
+    module = restart(make_module, tsc)
+    module.curr_quality = 'unavailable'
+    monkeypatch.setattr(fake_api.catalog, 'reject_renewals', True)
+    module.get_album_info(ALBUM)
+    assert fake_api.requests['check.php'] == 1
+    assert fake_api.requests['login.php'] == 1
+    assert 'not accessible' in capsys.readouterr().out
+
+
+def test_reset_session_drops_sid(api):
+    api.ensure_session()
+    assert api.base_params['sid'] == 'fake-sid'
+    api.reset_session()
+    assert 'sid' not in api.params
+    assert 'sid' not in api.base_params
@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+IDS = [f'S{1003 * 100 + j:017d}' for j in range(1, 9)]
+
+
+def slow(func, delay=0.05):
+    def wrapper(*args):
+        time.sleep(delay)
+        return func(*args)
+    return wrapper
+
+
+def test_concurrent_lookups_share_a_batch(make_module, fake_api):
+    module = make_module()
+    module.queue_songs(IDS)
+    module.session.get_songs_batched = slow(module.session.get_songs_batched)
+
+    with ThreadPoolExecutor(len(IDS)) as pool:
+        songs = list(pool.map(module.get_song, IDS))
+
+    assert [song.id for song in songs] == IDS
+    assert dict(fake_api.requests) == {'v2/song': 1}
+
+
+def test_failed_batch_keeps_queued_ids(make_module, fake_api):
+    module = make_module()
+    module.queue_songs(IDS)
+    get_songs_batched = module.session.get_songs_batched
+
+    def fail(ids):
+        raise Exception('Track not found')
+
+    module.session.get_songs_batched = fail
+    with pytest.raises(Exception):
+        module.get_song(IDS[0])
+
+    module.session.get_songs_batched = get_songs_batched
+    assert module.get_song(IDS[0]).id == IDS[0]
+    assert all(id in module.songs for id in IDS)
+    assert dict(fake_api.requests) == {'v2/song': 1}
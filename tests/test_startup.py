@@ -0,0 +1,35 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO
+
+pytest.importorskip('pytest_benchmark')
+
+
+def test_api_import_skips_heavy_modules():
+    # cryptodome, tqdm and sqlite only get imported once something uses them
+    code = f'''
+import importlib, json, sys
+sys.path.insert(0, {str(REPO.parent)!r})
+importlib.import_module({REPO.name + '.kkapi'!r})
+print(json.dumps([name for name in ('Cryptodome', 'tqdm', 'sqlite3') if name in sys.modules]))
+'''
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == []
+
+
+def test_startup(benchmark, make_module, fake_api):
+    # a module that was logged in before, parsing urls shouldn't need the api at all
+    tsc = make_module().tsc
+
+    def start():
+        module = make_module(login=False, tsc=tsc)
+        module.custom_url_parse('https://play.kkbox.com/album/A00000000000001003')
+        return module
+
+    module = benchmark(start)
+    assert module._session is None
+    assert not fake_api.requests
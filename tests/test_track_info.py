@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+ALBUM = 'A00000000000001003'
+
+
+def test_track_info_from_album_data(benchmark, make_module, fake_api):
+    from utils.models import QualityEnum
+
+    module = make_module()
+    album = module.get_album_info(ALBUM)
+    track_id = album.tracks[0]
+    song = album.track_extra_kwargs['data'][track_id]
+
+    track = benchmark(module.get_track_info, track_id, QualityEnum.LOSSLESS, None, **album.track_extra_kwargs)
+
+    # building the same track over and over must not grow the cached artist lists
+    assert track.artists == list(song.main_artists)
+    assert song.main_artists == ('Artist 1',)
+    assert track.album == 'Album 1003'
+    assert track.release_year == 2003
+    assert track.tags.total_tracks == len(album.tracks)
+    # everything comes from the album data, so no request gets made per track
+    assert dict(fake_api.requests) == {'v1/album/{id}': 1, 'album_more.php': 1}
@@ -0,0 +1,61 @@
+import pytest
+
+
+@pytest.mark.parametrize('url, media_type, media_id', [
+    ('https://play.kkbox.com/album/OspOC7CYqcVQY_uLAV', 'album', 'OspOC7CYqcVQY_uLAV'),
+    ('https://play.kkbox.com/track/OspOC7CYqcVQY_uLAV', 'track', 'OspOC7CYqcVQY_uLAV'),
+    ('https://play.kkbox.com/song/OspOC7CYqcVQY_uLAV', 'track', 'OspOC7CYqcVQY_uLAV'),
+    ('https://www.kkbox.com/tw/tc/artist/GtjT_E-Fw6HSCE7jgQ', 'artist', 'GtjT_E-Fw6HSCE7jgQ'),
+    ('https://www.kkbox.com/jp/playlist/OspOC7CYqcVQY_uLAV', 'playlist', 'OspOC7CYqcVQY_uLAV'),
+    ('https://kkbox.com/song/OspOC7CYqcVQY_uLAV?utm_source=x', 'track', 'OspOC7CYqcVQY_uLAV'),
+    ('  https://play.kkbox.com/album/OspOC7CYqcVQY_uLAV  ', 'album', 'OspOC7CYqcVQY_uLAV'),
+])
+def test_custom_url_parse(make_module, url, media_type, media_id):
+    ident = make_module(login=False).custom_url_parse(url)
+    assert ident.media_type.name == media_type
+    assert ident.media_id == media_id
+
+
+@pytest.mark.parametrize('url', [
+    'https://play.kkbox.com/video/OspOC7CYqcVQY_uLAV',
+    'https://example.com/album/OspOC7CYqcVQY_uLAV',
+    'https://www.kkbox.com/tw/tc/album/short',
+])
+def test_invalid_urls(make_module, url):
+    with pytest.raises(Exception, match='Invalid URL'):
+        make_module(login=False).custom_url_parse(url)
+
+
+def test_parse_url_file(make_module, tmp_path):
+    from utils.models import DownloadTypeEnum
+    path = tmp_path / 'queue.txt'
+    path.write_text('\n'.join([
+        '# albums',
+        'https://play.kkbox.com/album/OspOC7CYqcVQY_uLAV',
+        'https://www.kkbox.com/tw/tc/album/OspOC7CYqcVQY_uLAV',
+        'https://play.kkbox.com/song/GtjT_E-Fw6HSCE7jgQ',
+        'not a url',
+        '',
+    ]), encoding='utf-8')
+
+    assert make_module(login=False).parse_url_file(str(path)) == {
+        DownloadTypeEnum.album: ['OspOC7CYqcVQY_uLAV'],
+        DownloadTypeEnum.track: ['GtjT_E-Fw6HSCE7jgQ'],
+    }
+
+
+def test_unreachable_short_links_are_skipped(make_module, tmp_path, capsys):
+    import requests
+    from utils.models import DownloadTypeEnum
+    path = tmp_path / 'queue.txt'
+    path.write_text('https://kkbox.fm/abc123\nhttps://play.kkbox.com/album/OspOC7CYqcVQY_uLAV\n', encoding='utf-8')
+
+    module = make_module(login=False)
+
+    def head(url, **kwargs):
+        raise requests.ConnectionError('unreachable')
+
+    module.session.s.head = head
+
+    assert module.parse_url_file(str(path)) == {DownloadTypeEnum.album: ['OspOC7CYqcVQY_uLAV']}
+    assert "Couldn't resolve https://kkbox.fm/abc123" in capsys.readouterr().out
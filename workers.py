@@ -0,0 +1,18 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def ordered_map(func, items, workers):
+    # runs func over items on a bounded pool, yielding results in input order as soon as each one is ready
+    with ThreadPoolExecutor(workers) as pool:
+        futures = deque()
+        try:
+            for item in items:
+                futures.append(pool.submit(func, item))
+                if len(futures) >= workers * 2:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()